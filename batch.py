@@ -0,0 +1,189 @@
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, TextIO, Tuple
+
+BatchJob = Tuple[int, str, List[str]]  # (job number, input path, options)
+
+# Placeholder in the options of a job replaced by the input file name without its suffix
+NAME_PLACEHOLDER = "{name}"
+
+
+def read_jobs(source: str) -> Iterator[BatchJob]:
+    """
+    バッチ処理のジョブを順に読み出します．
+
+    source がディレクトリの場合，その中の各ファイル (名前順) を入力とし，追加のオプションのないジョブにします．
+    それ以外の場合は 1 行 1 ジョブのマニフェストとして読みます．各行は入力ファイルのパスとそのジョブだけの
+    オプションを空白で区切ったもの (シェルと同じ引用符が使えます) で，空行と # で始まる行は読み飛ばします．
+    source が "-" の場合は標準入力から 1 行ずつ読むため，届いた行から順に処理できます．
+    マニフェスト内の相対パスはマニフェストのあるディレクトリではなく，カレントディレクトリから解釈します．
+    """
+    if os.path.isdir(source):
+        names = sorted(
+            name
+            for name in os.listdir(source)
+            if os.path.isfile(os.path.join(source, name))
+        )
+        for number, name in enumerate(names):
+            yield number, os.path.join(source, name), []
+        return
+
+    with contextlib.ExitStack() as stack:
+        lines = sys.stdin if source == "-" else stack.enter_context(open(source))
+        number = 0
+        for line in lines:
+            words = shlex.split(line, comments=True)
+            if not words:
+                continue
+            yield number, words[0], words[1:]
+            number += 1
+
+
+def job_name(input_path: str) -> str:
+    """
+    入力ファイル名から拡張子を除いた，出力先の {name} に入れる名前を返します．
+    """
+    return os.path.splitext(os.path.basename(input_path))[0]
+
+
+class _NoStdout(io.TextIOBase):
+    """
+    並行するジョブの出力と状態の報告が混ざらないよう，ジョブからの標準出力への書き込みをエラーにします．
+    """
+
+    def _error(self) -> ValueError:
+        return ValueError("Error: Batch jobs must write their outputs to files.")
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        raise self._error()
+
+    @property
+    def buffer(self):
+        raise self._error()
+
+
+def _execute(run: Callable[[BatchJob], None], job: BatchJob) -> Dict[str, object]:
+    """
+    1 つのジョブを実行し，結果を辞書で返します．ジョブの失敗は例外ではなく結果として返します．
+    ジョブが標準エラー出力に書いたメッセージは結果の messages に入れます．
+    """
+    number, input_path, _ = job
+    messages = io.StringIO()
+    status = "ok"
+    start = time.perf_counter()
+    stdin, stdout = sys.stdin, sys.stdout
+    try:
+        with contextlib.redirect_stderr(messages):
+            sys.stdout = _NoStdout()
+            try:
+                with open(input_path) as f:
+                    sys.stdin = f
+                    run(job)
+            except SystemExit as e:
+                # Invalid options of the job. argparse has already printed the reason.
+                if e.code:
+                    status = "failed"
+            except Exception as e:
+                status = "failed"
+                print(
+                    str(e) if isinstance(e, (ValueError, OSError)) else repr(e),
+                    file=sys.stderr,
+                )
+    finally:
+        sys.stdin, sys.stdout = stdin, stdout
+    return {
+        "job": number,
+        "input": input_path,
+        "status": status,
+        "seconds": round(time.perf_counter() - start, 6),
+        "messages": messages.getvalue().splitlines(),
+    }
+
+
+def _failure(job: BatchJob, start: float, error: Exception) -> Dict[str, object]:
+    """
+    ワーカープールがジョブを実行できなかった場合 (ワーカーの異常終了，ジョブや結果を pickle できないなど) の
+    失敗の結果を返します．seconds はジョブを投入してからの経過時間です．
+    """
+    number, input_path, _ = job
+    return {
+        "job": number,
+        "input": input_path,
+        "status": "failed",
+        "seconds": round(time.perf_counter() - start, 6),
+        "messages": [repr(error)],
+    }
+
+
+def run_batch(
+    jobs: Iterable[BatchJob],
+    run: Callable[[BatchJob], None],
+    workers: int,
+    out: TextIO,
+) -> Tuple[int, int]:
+    """
+    ジョブをワーカープールで実行し，終わったジョブから順に結果を 1 行の JSON として out に書き出します．
+    失敗したジョブがあっても残りのジョブは続けます．
+
+    Args:
+        jobs (Iterable[BatchJob]): 実行するジョブ．プールが処理している間も読み進めます
+        run (Callable[[BatchJob], None]): 標準入力を入力ファイルにした状態で 1 つのジョブを実行する関数
+        workers (int): ワーカープロセス数．1 の場合や fork できない環境ではこのプロセスで順に実行します
+        out (TextIO): 結果の出力先
+
+    Returns:
+        succeeded (int): 成功したジョブ数
+        failed (int): 失敗したジョブ数
+    """
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def report(result: Dict[str, object]) -> None:
+        with lock:
+            counts[result["status"]] += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+
+    # Jobs swap sys.stdin and sys.stdout, so they cannot share a process as threads
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for job in jobs:
+            report(_execute(run, job))
+        return counts["ok"], counts["failed"]
+
+    # Forked workers inherit the imported modules and compiled regexes, and live for the
+    # whole batch. Nothing buffered before the fork may be written twice.
+    out.flush()
+    context = multiprocessing.get_context("fork")
+
+    def report_future(job: BatchJob, start: float, future: Future) -> None:
+        # An exception raised here would only be logged by the executor
+        try:
+            result = future.result()
+        except Exception as e:
+            result = _failure(job, start, e)
+        report(result)
+
+    with ProcessPoolExecutor(workers, mp_context=context) as executor:
+        for job in jobs:
+            start = time.perf_counter()
+            try:
+                future = executor.submit(_execute, run, job)
+            except BrokenProcessPool as e:
+                # A worker has died, and the pool accepts no more jobs
+                report(_failure(job, start, e))
+                continue
+            future.add_done_callback(partial(report_future, job, start))
+    return counts["ok"], counts["failed"]
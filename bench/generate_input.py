@@ -0,0 +1,128 @@
+import argparse
+import random
+import sys
+from typing import List, TextIO
+
+RULE_NAMES = ["move", "pick", "drop", "fail", "retry"]
+WEIGHTS = ["1", "2", "0.5", "3", "0.3333"]
+RATES = ["1", "1.5", "2", "0.1"]
+REWARDS = ["1", "2.5", "0.125", "10"]
+LABELS = ["goal", "fail", "busy", "idle"]
+
+
+def _way_point_content(rnd: random.Random, num_actions: int) -> str:
+    """
+    ルール情報を持つ中間状態の内容を作ります．
+    """
+    parts = [f'rule_name("{rnd.choice(RULE_NAMES)}")']
+    if num_actions > 0:
+        parts.append(f'action("act{rnd.randrange(num_actions)}")')
+    if rnd.random() < 0.8:
+        parts.append(f"weight({rnd.choice(WEIGHTS)})")
+    if rnd.random() < 0.5:
+        parts.append(f"rate({rnd.choice(RATES)})")
+    if rnd.random() < 0.3:
+        parts.append(f"reward({rnd.choice(REWARDS)})")
+    rnd.shuffle(parts)
+    return " " + ". ".join(parts) + ". "
+
+
+def generate(
+    out: TextIO,
+    num_states: int,
+    branching: int = 3,
+    label_density: float = 0.3,
+    num_actions: int = 2,
+    seed: int = 0,
+) -> None:
+    """
+    メタインタプリタの実行結果を模した入力を生成します．
+
+    各状態は平均 branching 個の中間状態 (rule_name, action, weight, rate, reward を持つ) を経由して
+    他の状態へ遷移します．すべての状態は初期状態から到達可能です．
+
+    Args:
+        out (TextIO): 出力先
+        num_states (int): 中間状態を除いた状態数
+        branching (int): 1 状態あたりの平均遷移数
+        label_density (float): ラベルを持つ状態の割合
+        num_actions (int): MDP の選択に使う action の種類数
+        seed (int): 乱数の種
+    """
+    rnd = random.Random(seed)
+
+    # Interpreter IDs are not contiguous and do not follow the BFS order
+    num_way_points_max = num_states * (2 * branching + 1)
+    ids = rnd.sample(range(1, 4 * (num_states + num_way_points_max)), num_states)
+    next_way_point_id = 4 * (num_states + num_way_points_max)
+
+    transitions: List[str] = []
+    contents: List[str] = []
+    for i, state_id in enumerate(ids):
+        contents.append(f"state({state_id},{{counter({i}). phase(p{i % 7}).}})\n")
+        out_degree = rnd.randint(1, 2 * branching - 1) if branching > 0 else 0
+        for k in range(out_degree):
+            way_point_id = next_way_point_id
+            next_way_point_id += 1
+            contents.append(
+                f"state({way_point_id},{{{_way_point_content(rnd, num_actions)}}})\n"
+            )
+            transitions.append(f"[{state_id}|{way_point_id}]")
+
+            # The first transition keeps every state reachable from the initial state
+            if k == 0 and i + 1 < num_states:
+                target = ids[i + 1]
+            else:
+                target = ids[rnd.randrange(num_states)]
+            transitions.append(f"[{way_point_id}|{target}]")
+            if rnd.random() < 0.1:
+                transitions.append(f"[{way_point_id}|{ids[rnd.randrange(num_states)]}]")
+
+    labels = [
+        f'label({state_id},"{rnd.choice(LABELS)}")\n'
+        for state_id in ids
+        if rnd.random() < label_density
+    ]
+
+    rnd.shuffle(transitions)
+    rnd.shuffle(contents)
+    out.write(
+        f"ret(ss({ids[0]},<state_map>),n({len(contents)}),t({len(transitions)}))\n"
+    )
+    out.write("transitions([" + ",\n".join(transitions) + "])\n")
+    out.writelines(contents)
+    out.writelines(labels)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic meta-interpreter output."
+    )
+    parser.add_argument("--states", type=int, default=1000, help="Number of states.")
+    parser.add_argument(
+        "--branching", type=int, default=3, help="Average transitions per state."
+    )
+    parser.add_argument(
+        "--label-density",
+        type=float,
+        default=0.3,
+        help="Fraction of states with a label.",
+    )
+    parser.add_argument(
+        "--actions", type=int, default=2, help="Number of distinct actions."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    generate(
+        sys.stdout,
+        args.states,
+        branching=args.branching,
+        label_density=args.label_density,
+        num_actions=args.actions,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
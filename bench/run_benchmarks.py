@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from generate_input import generate  # noqa: E402
+from lib.profiler import Profiler  # noqa: E402
+
+MODEL_TYPES = ["dtmc", "mdp", "ctmc"]
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_stages(input_path: str) -> dict:
+    """
+    1 つの入力に対して各段階を順に実行し，段階ごとの時間を計測します．
+    プロセス全体のピーク RSS を測るため，入力ごとに別プロセスで呼び出します．
+    """
+    from parse_input import parse_input_file, parse_input_stream
+    from modifier import normalize, modify_transitions, normalize_and_modify
+    from transition_generator import generate_dtmc, generate_mdp, generate_ctmc
+    from output import output_dtmc, output_mdp, output_ctmc, output_labels, output_trew
+
+    generators = {"dtmc": generate_dtmc, "mdp": generate_mdp, "ctmc": generate_ctmc}
+    writers = {"dtmc": output_dtmc, "mdp": output_mdp, "ctmc": output_ctmc}
+    # Memory is not traced, as tracemalloc would distort the timings
+    profiler = Profiler(trace_memory=False)
+
+    with profiler.stage("parse"):
+        with open(input_path) as f:
+            _, _, initial_state_id, raw_transitions, raw_states, raw_labels = (
+                parse_input_stream(f)
+            )
+    with profiler.stage("parse_without_contents"):
+        with open(input_path) as f:
+            parse_input_stream(f, state_contents=False)
+    with profiler.stage("parse_mapped"):
+        parse_input_file(input_path)
+    with profiler.stage("normalize"):
+        normalized = normalize(
+            initial_state_id, raw_transitions, raw_states, raw_labels
+        )
+    with profiler.stage("modify"):
+        n, t, transitions, states, labels = modify_transitions(*normalized)
+    del normalized
+    with profiler.stage("normalize_and_modify"):
+        normalize_and_modify(initial_state_id, raw_transitions, raw_states, raw_labels)
+
+    with open(os.devnull, "w") as devnull:
+        for model_type in MODEL_TYPES:
+            with profiler.stage(f"generate_{model_type}"):
+                generated = generators[model_type](transitions)
+            with profiler.stage(f"output_{model_type}"):
+                writers[model_type](n, t, generated, devnull)
+            del generated
+        with profiler.stage("output_labels"):
+            output_labels(labels, devnull)
+        with profiler.stage("output_trew"):
+            output_trew(t, transitions, devnull)
+
+    return {
+        "counts": {
+            "raw_transitions": len(raw_transitions),
+            "raw_states": len(raw_states),
+            "states": n,
+            "transitions": t,
+            "labels": len(labels),
+        },
+        "stages": {
+            stage["name"]: {"wall": stage["wall"], "cpu": stage["cpu"]}
+            for stage in profiler.stages
+        },
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _numpy_version() -> str:
+    try:
+        import numpy
+    except ImportError:
+        return ""
+    return numpy.__version__
+
+
+def run_config(config: dict, repeat: int) -> dict:
+    """
+    設定に従って入力を生成し，repeat 回の計測のうち段階ごとの最小時間と最大のピーク RSS を返します．
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.txt")
+        with open(input_path, "w") as f:
+            generate(f, **config)
+
+        runs = []
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-stages", input_path],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(json.loads(completed.stdout))
+
+        result = {
+            "config": config,
+            "input_bytes": os.path.getsize(input_path),
+            "counts": runs[0]["counts"],
+            "stages": {
+                name: {
+                    key: min(run["stages"][name][key] for run in runs)
+                    for key in ("wall", "cpu")
+                }
+                for name in runs[0]["stages"]
+            },
+            "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+        }
+    return result
+
+
+def _config_key(config: dict) -> str:
+    return json.dumps(config, sort_keys=True)
+
+
+def print_report(results: List[dict], baseline: List[dict]) -> None:
+    """
+    結果を表形式で標準エラー出力に表示します．baseline があれば各段階の時間の比も表示します．
+    """
+    baseline_by_config = {_config_key(r["config"]): r for r in baseline}
+    for result in results:
+        base = baseline_by_config.get(_config_key(result["config"]))
+        config = " ".join(f"{k}={v}" for k, v in result["config"].items())
+        print(
+            f"# {config}  ({result['counts']['states']} states, "
+            f"{result['counts']['transitions']} transitions, "
+            f"peak RSS {result['peak_rss_kb'] / 1024:.1f} MiB)",
+            file=sys.stderr,
+        )
+        for name, times in result["stages"].items():
+            line = f"  {name:<22} wall {times['wall']:8.3f}s  cpu {times['cpu']:8.3f}s"
+            if base is not None and name in base["stages"]:
+                before = base["stages"][name]["wall"]
+                if before > 0:
+                    line += f"  x{times['wall'] / before:.2f} vs baseline"
+            print(line, file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark each translation stage.")
+    parser.add_argument(
+        "--states",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="State counts to benchmark.",
+    )
+    parser.add_argument("--branching", type=int, default=3)
+    parser.add_argument("--label-density", type=float, default=0.3)
+    parser.add_argument("--actions", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per size; the fastest is kept."
+    )
+    parser.add_argument(
+        "--output", type=str, help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--compare", type=str, help="Compare with the results in this JSON file."
+    )
+    parser.add_argument("--run-stages", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stages:
+        json.dump(run_stages(args.run_stages), sys.stdout)
+        return
+
+    results = [
+        run_config(
+            {
+                "num_states": num_states,
+                "branching": args.branching,
+                "label_density": args.label_density,
+                "num_actions": args.actions,
+                "seed": args.seed,
+            },
+            args.repeat,
+        )
+        for num_states in args.states
+    ]
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": _numpy_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    baseline = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
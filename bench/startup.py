@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+TRANSLATOR = os.path.join(REPO_DIR, "translator.py")
+
+from generate_input import generate  # noqa: E402
+
+# Command lines measured, as a sweep job would run them
+SCENARIOS = {
+    "help": ["--help"],
+    "dtmc": ["--model-type", "dtmc", "--output-for-prism"],
+    "mdp": ["--model-type", "mdp", "--output-for-prism"],
+    "ctmc": ["--model-type", "ctmc", "--output-for-prism"],
+    "emit": ["--emit", "dtmc.tra={out}/a.tra", "--emit", "lab={out}/a.lab"],
+}
+
+
+def _environment() -> Dict[str, str]:
+    # Startup is measured as installed, with the bytecode written and reused
+    environment = dict(os.environ)
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    return environment
+
+
+def _run(arguments: List[str], input_path: str, python_options: List[str] = ()):
+    with open(input_path) as stdin:
+        return subprocess.run(
+            [sys.executable, *python_options, TRANSLATOR, *arguments],
+            stdin=stdin,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=_environment(),
+            check=True,
+        )
+
+
+def import_times(arguments: List[str], input_path: str) -> Dict[str, float]:
+    """
+    python -X importtime の出力から，トップレベルで読み込んだモジュールごとの累積時間 (秒) を返します．
+    """
+    stderr = _run(arguments, input_path, ["-X", "importtime"]).stderr
+    times: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented and already counted in their parent
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def measure(arguments: List[str], input_path: str, repeat: int) -> dict:
+    """
+    コマンドを repeat 回実行した経過時間の最小値・中央値と，モジュールの読み込み時間を返します．
+    """
+    _run(arguments, input_path)  # Write the bytecode first
+    walls = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run(arguments, input_path)
+        walls.append(time.perf_counter() - start)
+    imports = import_times(arguments, input_path)
+    return {
+        "wall_min": min(walls),
+        "wall_median": statistics.median(walls),
+        "import_total": sum(imports.values()),
+        "imports": dict(sorted(imports.items(), key=lambda item: -item[1])),
+    }
+
+
+def print_report(results: Dict[str, dict], baseline: Dict[str, dict], top: int) -> None:
+    """
+    結果を標準エラー出力に表示します．baseline があれば時間の比も表示します．
+    """
+    for name, result in results.items():
+        line = (
+            f"{name:<8} wall min {result['wall_min']:7.3f}s  median "
+            f"{result['wall_median']:7.3f}s  imports {result['import_total']:7.3f}s"
+        )
+        base = baseline.get(name)
+        if base is not None and base["wall_min"] > 0:
+            line += f"  x{result['wall_min'] / base['wall_min']:.2f} vs baseline"
+        print(line, file=sys.stderr)
+        for module, seconds in list(result["imports"].items())[:top]:
+            print(f"    {module:<28}{seconds:8.4f}s", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the startup of the translator on a small input."
+    )
+    parser.add_argument(
+        "--states", type=int, default=100, help="States of the generated input."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Runs per scenario; min and median kept."
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+        help="Command lines to measure.",
+    )
+    parser.add_argument(
+        "--top", type=int, default=8, help="Slowest top-level imports to show."
+    )
+    parser.add_argument(
+        "--output", type=str, help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--compare", type=str, help="Compare with the results in this JSON file."
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.txt")
+        with open(input_path, "w") as f:
+            generate(f, num_states=args.states)
+        for name in args.scenarios:
+            arguments = [a.replace("{out}", directory) for a in SCENARIOS[name]]
+            results[name] = measure(arguments, input_path, args.repeat)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_report(results, baseline, args.top)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "states": args.states,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
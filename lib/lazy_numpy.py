@@ -0,0 +1,20 @@
+from types import ModuleType
+from typing import Optional
+
+_numpy: Optional[ModuleType] = None
+_loaded = False
+
+
+def load_numpy() -> Optional[ModuleType]:
+    """
+    NumPy を初めて呼び出されたときに読み込んで返します．インストールされていない場合は None を返します．
+    NumPy の読み込みには小さな入力の変換全体より時間がかかるため，使うことが決まるまで読み込みません．
+    """
+    global _numpy, _loaded
+    if not _loaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy, _loaded = numpy, True
+    return _numpy
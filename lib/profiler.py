@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, TextIO
+
+
+class Profiler:
+    """
+    処理の段階ごとに経過時間・CPU 時間・ピークメモリを計測し，要素数とあわせて報告します．
+
+    trace_memory が True の場合は tracemalloc で Python が確保したメモリのピークを段階ごとに記録します．
+    tracemalloc は処理を数倍遅くするため，時間だけを測る場合は False にします．
+    enabled が False の場合は何も計測しません．
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = True) -> None:
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages: List[Dict[str, object]] = []
+        self.counts: Dict[str, int] = {}
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self.trace_memory:
+            # Imported only when tracing, as tracemalloc is slow to import
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        with ブロックの処理を 1 つの段階として計測します．
+        """
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record: Dict[str, object] = {
+                "name": name,
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+            }
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record["peak_memory"] = peak
+                record["memory"] = current
+            self.stages.append(record)
+
+    def count(self, name: str, value: int) -> None:
+        """
+        要素数などの値を記録します．
+        """
+        if self.enabled:
+            self.counts[name] = value
+
+    def summary(self) -> Dict[str, object]:
+        """
+        計測結果を辞書にまとめます．
+        """
+        total: Dict[str, object] = {
+            "wall": time.perf_counter() - self._start_wall,
+            "cpu": time.process_time() - self._start_cpu,
+        }
+        if self.trace_memory:
+            total["peak_memory"] = max(
+                (stage["peak_memory"] for stage in self.stages), default=0
+            )
+        return {"stages": self.stages, "total": total, "counts": self.counts}
+
+    def report(self, out: TextIO, output_format: str = "text") -> None:
+        """
+        計測結果を out に書き出します．output_format は "text" または "json" です．
+        """
+        if not self.enabled:
+            return
+
+        summary = self.summary()
+        if output_format == "json":
+            import json
+
+            json.dump(summary, out)
+            out.write("\n")
+            return
+
+        memory = self.trace_memory
+        header = f"{'stage':<24}{'wall(s)':>10}{'cpu(s)':>10}"
+        out.write(header + (f"{'peak(MiB)':>12}" if memory else "") + "\n")
+        for record in summary["stages"] + [dict(summary["total"], name="total")]:
+            line = f"{record['name']:<24}{record['wall']:>10.3f}{record['cpu']:>10.3f}"
+            if memory:
+                line += f"{record['peak_memory'] / (1 << 20):>12.1f}"
+            out.write(line + "\n")
+        for name, value in summary["counts"].items():
+            out.write(f"{name:<24}{value:>10}\n")
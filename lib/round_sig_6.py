@@ -1,10 +1,25 @@
-def round_sig_6(num: float) -> str:
-    from decimal import Decimal, ROUND_HALF_UP
-    import math
+import math
+from typing import Iterable, List
 
+
+def round_sig_6(num: float) -> str:
     if num == 0:
         return "0"
 
+    # 有効数字6桁以内の値は丸めが不要なので，repr の表記をそのまま整形する
+    text = repr(num)
+    if -1e6 < num < 1e6 and "e" not in text and "n" not in text:
+        digits = text.lstrip("-").replace(".", "").strip("0")
+        if len(digits) <= 6:
+            if "." in text:
+                # Drop the fractional zeros first, as Decimal.normalize() does below
+                text = text.rstrip("0").rstrip(".")
+            return text.rstrip("0").rstrip(".")
+
+    # decimal is only imported for values that need rounding, and the results are cached
+    # by round_sig_6_batch, so this import runs once per distinct value at most
+    from decimal import Decimal, ROUND_HALF_UP
+
     # Decimalに変換（精度を保つため文字列経由）
     dnum = Decimal(str(num))
 
@@ -15,3 +30,28 @@ def round_sig_6(num: float) -> str:
     # 不要な0や小数点を除いて整形
     result = format(rounded.normalize(), "f").rstrip("0").rstrip(".")
     return result
+
+
+class _RoundSig6Cache(dict):
+    """
+    値 -> 整形済み文字列 のキャッシュ．未登録の値は round_sig_6 で整形して登録します．
+    """
+
+    def __missing__(self, num: float) -> str:
+        result = self[num] = round_sig_6(num)
+        return result
+
+
+_CACHE_LIMIT = 1 << 20
+_cache = _RoundSig6Cache()
+
+
+def round_sig_6_batch(nums: Iterable[float]) -> List[str]:
+    """
+    数値の列をまとめて有効数字6桁の文字列に変換します．
+
+    確率 0.5 のように同じ値が繰り返し現れることが多いため，変換結果をキャッシュして再利用します．
+    """
+    if len(_cache) > _CACHE_LIMIT:
+        _cache.clear()
+    return list(map(_cache.__getitem__, nums))
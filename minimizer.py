@@ -0,0 +1,252 @@
+from array import array
+from typing import Dict, List, Sequence, Set, Tuple
+from model_store import Model
+from pruner import reverse_graph
+from type import Label, State, StateList, TextSelection, TransitionGraph
+
+# Name of the rule and, outside MDPs, the action of quotient transitions, which merge
+# transitions of several rules
+QUOTIENT_NAME = "UNKNOWN"
+# Digits after the point kept when comparing probabilities, rates and reward masses, so that
+# sums taken in different orders compare equal
+_PRECISION = 12
+
+# Outgoing (action, destination block) -> [probability or rate, probability times reward]
+_Signature = Tuple[Tuple[int, int, float, float], ...]
+
+
+def _edges(
+    n: int,
+    model_type: str,
+    generated: list,
+    transitions: TransitionGraph,
+) -> Tuple["array[int]", "array[int]", "array[int]", "array[float]", "array[float]"]:
+    """
+    生成した遷移を CSR 形式の (offsets, action, dest, value, reward_mass) に変換します．
+    value は確率 (CTMC ではレート)，reward_mass は value と遷移報酬の積です．
+    MDP 以外では action はすべて 0 です．
+    """
+    # Transition rewards, which are kept per (src, dest) of the collapsed graph
+    rewards: Dict[int, float] = {}
+    for src, to, _, _, _, _, _, reward in transitions.modified_transitions():
+        if reward != 0.0:
+            rewards[src * n + to] = reward
+
+    offsets = array("q", [0]) * (n + 1)
+    actions = array("q")
+    dest = array("q")
+    values = array("d")
+    reward_masses = array("d")
+    action_ids: Dict[str, int] = {}
+    for row in generated:
+        if model_type == "mdp":
+            src, _, to, value, action = row
+            actions.append(action_ids.setdefault(action, len(action_ids)))
+        else:
+            src, to, value = row
+            actions.append(0)
+        offsets[src + 1] += 1
+        dest.append(to)
+        values.append(value)
+        reward_masses.append(value * rewards.get(src * n + to, 0.0))
+    for state in range(n):
+        offsets[state + 1] += offsets[state]
+    return offsets, actions, dest, values, reward_masses
+
+
+def minimize(
+    model: Model, model_type: str, generated: list
+) -> Tuple[Model, "array[int]"]:
+    """
+    ラベルと遷移報酬を保つ最も粗い強 (確率) 双模倣で状態をまとめた商モデルを作ります．
+
+    各状態の遷移先のブロックごとの確率 (CTMC ではレート) と報酬の和をシグネチャとし，
+    シグネチャの異なる状態を別のブロックに分ける分割の細分化を安定するまで繰り返します．
+    ブロックが分かれた場合は最大の部分が元のブロックを引き継ぎ，移った状態の前の状態だけを次に調べるため，
+    数百万状態でも各状態を調べ直す回数はわずかです．MDP では action ごとの分布をまとめて比べます．
+
+    商モデルの遷移は各ブロックの代表 (最小の状態 ID の状態) の遷移をブロックごとにまとめたものです．
+    確率は weight (CTMC ではレートは rate) に入れるため，同じ model_type で遷移を生成し直すと
+    元の確率の和が得られます．遷移報酬は確率で重み付けした平均です．
+
+    Args:
+        model: 中間状態を取り除いた遷移系 (n, t, transitions, states, labels)
+        model_type (str): "dtmc", "mdp" または "ctmc"
+        generated (list): model から model_type の生成関数で作った遷移
+
+    Returns:
+        quotient: 商モデル．状態 ID は代表の状態 ID 順で，初期状態のブロックは 0 です
+        block_of (array[int]): 元の状態 ID -> 商モデルの状態 ID
+    """
+    n, _, transitions, states, labels = model
+    offsets, actions, dest, values, reward_masses = _edges(
+        n, model_type, generated, transitions
+    )
+    reverse_offsets, reverse_src = reverse_graph(offsets, dest)
+
+    def signature(state: int) -> _Signature:
+        sums: Dict[Tuple[int, int], List[float]] = {}
+        for i in range(offsets[state], offsets[state + 1]):
+            key = (actions[i], block[dest[i]])
+            total = sums.get(key)
+            if total is None:
+                sums[key] = [values[i], reward_masses[i]]
+            else:
+                total[0] += values[i]
+                total[1] += reward_masses[i]
+        return tuple(
+            sorted(
+                (action, to, round(value, _PRECISION), round(mass, _PRECISION))
+                for (action, to), (value, mass) in sums.items()
+            )
+        )
+
+    # Initial partition: states with the same set of labels
+    label_sets: Dict[int, List[str]] = {}
+    for state_id, label in labels:
+        label_sets.setdefault(state_id, []).append(label)
+    initial_blocks: Dict[Tuple[str, ...], int] = {}
+    block = array("q", [0]) * n
+    members: List[Set[int]] = []
+    for state in range(n):
+        key = tuple(sorted(set(label_sets.get(state, ()))))
+        b = initial_blocks.setdefault(key, len(initial_blocks))
+        if b == len(members):
+            members.append(set())
+        block[state] = b
+        members[b].add(state)
+
+    # States of a block that are not dirty still share the signature the block had when it
+    # was formed, so only the dirty states and one other member are compared
+    dirty = set(range(n))
+    while dirty:
+        dirty_by_block: Dict[int, List[int]] = {}
+        for state in sorted(dirty):
+            dirty_by_block.setdefault(block[state], []).append(state)
+
+        moved: List[int] = []
+        for b, dirty_members in dirty_by_block.items():
+            clean = len(members[b]) - len(dirty_members)
+            if clean + len(dirty_members) == 1:
+                continue
+            groups: Dict[_Signature, List[int]] = {}
+            if clean:
+                reference = next(s for s in members[b] if s not in dirty)
+                groups[signature(reference)] = []
+            for state in dirty_members:
+                groups.setdefault(signature(state), []).append(state)
+            if len(groups) == 1:
+                continue
+
+            # The first group also holds the clean members. The largest group keeps the block.
+            parts = list(groups.values())
+            sizes = [len(part) for part in parts]
+            sizes[0] += clean
+            largest = max(range(len(parts)), key=sizes.__getitem__)
+            for i, part in enumerate(parts):
+                if i == largest:
+                    continue
+                if i == 0 and clean:
+                    part = part + [s for s in members[b] if s not in dirty]
+                new_block = len(members)
+                members.append(set(part))
+                members[b].difference_update(part)
+                for state in part:
+                    block[state] = new_block
+                moved.extend(part)
+
+        dirty = set()
+        for state in moved:
+            dirty.update(
+                reverse_src[reverse_offsets[state] : reverse_offsets[state + 1]]
+            )
+
+    # Number the blocks in the order of their smallest states, so that block 0 is initial
+    quotient_id = array("q", [-1]) * len(members)
+    representatives = array("q")
+    for state in range(n):
+        if quotient_id[block[state]] < 0:
+            quotient_id[block[state]] = len(representatives)
+            representatives.append(state)
+    block_of = array("q", (quotient_id[b] for b in block))
+
+    # Quotient transitions: the representative's transitions summed per (action, block)
+    action_names = _action_names(model_type, generated)
+    quotient_actions = [QUOTIENT_NAME] if model_type != "mdp" else action_names
+    quotient_offsets = array("q", [0])
+    columns = {
+        "dest": array("q"),
+        "weight": array("d"),
+        "rate": array("d"),
+        "reward": array("d"),
+        "action_id": array("q"),
+    }
+    for state in representatives:
+        sums: Dict[Tuple[int, int], List[float]] = {}
+        for i in range(offsets[state], offsets[state + 1]):
+            key = (actions[i], block_of[dest[i]])
+            total = sums.setdefault(key, [0.0, 0.0])
+            total[0] += values[i]
+            total[1] += reward_masses[i]
+        for (action, to), (value, mass) in sorted(sums.items()):
+            columns["dest"].append(to)
+            columns["weight"].append(value if model_type != "ctmc" else 1.0)
+            columns["rate"].append(value if model_type == "ctmc" else 1.0)
+            columns["reward"].append(mass / value if value else 0.0)
+            columns["action_id"].append(action)
+        quotient_offsets.append(len(columns["dest"]))
+
+    num_edges = len(columns["dest"])
+    quotient_transitions = TransitionGraph(
+        quotient_offsets,
+        columns.pop("dest"),
+        count=array("q", [1]) * num_edges,
+        rule_id=array("q", [0]) * num_edges,
+        actions=quotient_actions,
+        rules=[QUOTIENT_NAME],
+        **columns,
+    )
+    is_representative = bytearray(n)
+    for state in representatives:
+        is_representative[state] = 1
+    quotient_labels: List[Label] = [
+        (block_of[state_id], label)
+        for state_id, label in labels
+        if is_representative[state_id]
+    ]
+    quotient = (
+        len(representatives),
+        num_edges,
+        quotient_transitions,
+        _representative_states(states, is_representative, block_of),
+        quotient_labels,
+    )
+    return quotient, block_of
+
+
+def _action_names(model_type: str, generated: list) -> List[str]:
+    """
+    _edges と同じ順に action の名前を並べます．
+    """
+    if model_type != "mdp":
+        return []
+    return list(dict.fromkeys(action for _, _, _, _, action in generated))
+
+
+def _representative_states(
+    states: Sequence[State], is_representative: bytearray, block_of: "array[int]"
+) -> Sequence[State]:
+    """
+    各ブロックの代表の状態だけを商モデルの状態 ID に置き換えます．StateList の内容はコピーせずに参照します．
+    """
+    if isinstance(states, StateList):
+        state_ids, texts = states.state_ids, states.texts
+    else:
+        state_ids, texts = [s for s, _ in states], [c for _, c in states]
+    positions = array(
+        "q", (i for i, state_id in enumerate(state_ids) if is_representative[state_id])
+    )
+    return StateList(
+        array("q", (block_of[state_ids[i]] for i in positions)),
+        TextSelection(texts, positions),
+    )
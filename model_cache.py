@@ -0,0 +1,130 @@
+import io
+import os
+import time
+from typing import BinaryIO, Optional
+from model_store import FORMAT_VERSION, Model, load_model, save_model
+
+# Environment variable giving the default cache directory
+CACHE_DIR_ENV = "PROB_LMNTAL_TRANSLATOR_CACHE"
+DEFAULT_MAX_SIZE = 1 << 30  # bytes
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60  # seconds
+
+# Number of bytes hashed at once
+_HASH_CHUNK_SIZE = 1 << 20
+_SUFFIX = ".model"
+
+
+def _new_hash():
+    # Imported here, as hashlib is slow to import and only needed with a cache
+    import hashlib
+
+    # The format version is part of the key, so that old entries are never read
+    return hashlib.sha256(f"prob-lmntal-translator model v{FORMAT_VERSION}\n".encode())
+
+
+def input_digest(stream: BinaryIO) -> str:
+    """
+    シーク可能な入力全体のハッシュ値を計算し，入力を先頭に戻します．
+    """
+    digest = _new_hash()
+    for chunk in iter(lambda: stream.read(_HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class HashingReader(io.RawIOBase):
+    """
+    読み出したバイト列のハッシュ値を計算しながら stream を読みます．
+    パイプのようにシークできない入力を，解析と同時にハッシュするために使います．
+    """
+
+    def __init__(self, stream: BinaryIO) -> None:
+        super().__init__()
+        self.stream = stream
+        self.digest = _new_hash()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.digest.update(data)
+        return size
+
+    def hexdigest(self) -> str:
+        """
+        残りの入力を読み切ったうえで，入力全体のハッシュ値を返します．
+        """
+        for chunk in iter(lambda: self.stream.read(_HASH_CHUNK_SIZE), b""):
+            self.digest.update(chunk)
+        return self.digest.hexdigest()
+
+
+class ModelCache:
+    """
+    入力のハッシュ値をキーとして，中間状態を取り除いた遷移系をディレクトリに保存します．
+    エントリは最終利用時刻 (mtime) が max_age 秒より古くなるか，
+    合計サイズが max_size バイトを超えた場合に古いものから削除されます．
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: int = DEFAULT_MAX_SIZE,
+        max_age: float = DEFAULT_MAX_AGE,
+    ) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + _SUFFIX)
+
+    def load(self, digest: str) -> Optional[Model]:
+        """
+        キャッシュされた遷移系を返します．存在しない，または読み込めない場合は None を返します．
+        """
+        path = self.path(digest)
+        try:
+            model = load_model(path)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return model
+
+    def store(self, digest: str, model: Model) -> None:
+        """
+        遷移系を保存し，上限を超えたエントリを削除します．保存に失敗しても変換は続けられるよう，OSError は無視します．
+        """
+        try:
+            save_model(self.path(digest), model)
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """
+        古いエントリを削除し，合計サイズを max_size 以下にします．
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        # Newest first
+        entries.sort(reverse=True)
+        expires = time.time() - self.max_age
+        total_size = 0
+        for mtime, size, path in entries:
+            if mtime >= expires and total_size + size <= self.max_size:
+                total_size += size
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
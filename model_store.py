@@ -0,0 +1,234 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterable, Sequence, Tuple
+from type import State, Label, StateList, TextTable, TransitionGraph
+
+# File layout:
+#   header:   magic, format version, byte order,
+#             then (n, t, #actions, #rules, #states, #labels, #state keys)
+#   sections: offsets, dest, count, weight, rate, reward, action_id, rule_id, actions, rules,
+#             state IDs, state contents, label state IDs, label texts, state keys
+# State keys are the interpreter's IDs of the collapsed states, saved for incremental
+# re-translation. They are empty in other files.
+# Numeric sections are native arrays. String sections are an offsets array followed by a UTF-8
+# heap. Every section starts at a multiple of 8 bytes.
+MAGIC = b"PLMTMDL\0"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sII7q")
+_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+_ALIGNMENT = 8
+
+Model = Tuple[int, int, TransitionGraph, Sequence[State], Sequence[Label]]
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % _ALIGNMENT)
+
+
+def _write_section(f: BinaryIO, section: Sequence) -> None:
+    f.write(section)
+    f.write(_padding(memoryview(section).nbytes))
+
+
+def _write_string_table(f: BinaryIO, strings: Iterable[str], length: int) -> None:
+    """
+    length 個の文字列を (offsets, UTF-8 のヒープ) の 2 つのセクションとして書き出します．
+    i 番目の文字列はヒープの offsets[i]:offsets[i + 1] です．
+    状態の内容のように大きくなりうるため，ヒープは 1 つずつ符号化して書き出し，offsets は最後に先に確保した位置へ
+    書き込みます．f はシーク可能である必要があります．
+    """
+    offsets = array("q", [0]) * (length + 1)
+    offsets_position = f.tell()
+    _write_section(f, offsets)
+    position = 0
+    for i, text in enumerate(strings):
+        data = text.encode("utf-8")
+        f.write(data)
+        position += len(data)
+        offsets[i + 1] = position
+    f.write(_padding(position))
+    end = f.tell()
+    f.seek(offsets_position)
+    f.write(offsets)
+    f.seek(end)
+
+
+def write_model(f: BinaryIO, model: Model, state_keys: Sequence[str] = ()) -> None:
+    """
+    中間状態を取り除いた遷移系をバイナリ形式で書き出します．
+
+    Args:
+        f (BinaryIO): 出力先 (シーク可能なファイル)
+        model: modify_transitions の戻り値 (n, t, transitions, states, labels)
+        state_keys (Sequence[str]): 各状態のメタインタプリタ上の ID (増分変換用，省略可)
+    """
+    n, t, transitions, states, labels = model
+    f.write(
+        _HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            _BYTE_ORDER,
+            n,
+            t,
+            len(transitions.actions),
+            len(transitions.rules),
+            len(states),
+            len(labels),
+            len(state_keys),
+        )
+    )
+
+    for section in (
+        transitions.offsets,
+        transitions.dest,
+        transitions.count,
+        transitions.weight,
+        transitions.rate,
+        transitions.reward,
+        transitions.action_id,
+        transitions.rule_id,
+    ):
+        _write_section(f, section)
+    _write_string_table(f, transitions.actions, len(transitions.actions))
+    _write_string_table(f, transitions.rules, len(transitions.rules))
+    _write_section(f, array("q", [state_id for state_id, _ in states]))
+    _write_string_table(f, (content for _, content in states), len(states))
+    _write_section(f, array("q", [state_id for state_id, _ in labels]))
+    _write_string_table(f, (label for _, label in labels), len(labels))
+    _write_string_table(f, state_keys, len(state_keys))
+
+
+def save_model(path: str, model: Model, state_keys: Sequence[str] = ()) -> None:
+    """
+    遷移系をファイルに保存します．書き込み途中のファイルが読まれないよう，一時ファイルに書いてから置き換えます．
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            write_model(f, model, state_keys)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+class _Reader:
+    """
+    バイナリ形式のバッファを先頭から順に読み出します．各列はバッファをコピーせずに参照します．
+    """
+
+    def __init__(self, buffer: memoryview) -> None:
+        self.buffer = buffer
+        self.position = _HEADER.size
+
+    def _take(self, nbytes: int) -> memoryview:
+        start = self.position
+        end = start + nbytes
+        if end > len(self.buffer):
+            raise ValueError("Error: Model file is truncated.")
+        self.position = end + (-nbytes % _ALIGNMENT)
+        return self.buffer[start:end]
+
+    def numbers(self, typecode: str, length: int) -> memoryview:
+        return self._take(length * struct.calcsize(typecode)).cast(typecode)
+
+    def strings(self, length: int) -> TextTable:
+        offsets = self.numbers("q", length + 1)
+        return TextTable(offsets, self._take(offsets[-1]))
+
+
+def read_model(buffer: memoryview) -> Tuple[Model, TextTable]:
+    """
+    write_model で書き出したバッファから遷移系と各状態のメタインタプリタ上の ID を読み込みます．
+    遷移の各列と状態・ラベルはバッファをそのまま参照するため，buffer を参照している間は有効です．
+
+    Raises:
+        ValueError: 形式やバージョンが異なる，またはデータが途中で切れている場合
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Error: Model file is truncated.")
+    (
+        magic,
+        version,
+        byte_order,
+        n,
+        t,
+        num_actions,
+        num_rules,
+        num_states,
+        num_labels,
+        num_state_keys,
+    ) = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Error: Not a model file.")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Error: Unsupported model file version {version}.")
+    if byte_order != _BYTE_ORDER:
+        raise ValueError("Error: Model file was written with a different byte order.")
+
+    reader = _Reader(buffer)
+    offsets = reader.numbers("q", n + 1)
+    dest = reader.numbers("q", t)
+    count = reader.numbers("q", t)
+    weight = reader.numbers("d", t)
+    rate = reader.numbers("d", t)
+    reward = reader.numbers("d", t)
+    action_id = reader.numbers("q", t)
+    rule_id = reader.numbers("q", t)
+    actions = list(reader.strings(num_actions))
+    rules = list(reader.strings(num_rules))
+    state_ids = reader.numbers("q", num_states)
+    state_contents = reader.strings(num_states)
+    label_ids = reader.numbers("q", num_labels)
+    label_texts = reader.strings(num_labels)
+    state_keys = reader.strings(num_state_keys)
+
+    transitions = TransitionGraph(
+        offsets,
+        dest,
+        count=count,
+        weight=weight,
+        rate=rate,
+        reward=reward,
+        action_id=action_id,
+        rule_id=rule_id,
+        actions=actions,
+        rules=rules,
+    )
+    states = StateList(state_ids, state_contents)
+    labels = StateList(label_ids, label_texts)
+    return (n, t, transitions, states, labels), state_keys
+
+
+def _map_file(path: str) -> memoryview:
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("Error: Model file is truncated.")
+            # The mapping stays open as long as the returned columns refer to it
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except OSError as e:
+        raise ValueError(f"Error: Cannot read model file {path}: {e.strerror}.") from e
+
+
+def load_model(path: str) -> Model:
+    """
+    ファイルをメモリマップして遷移系を読み込みます．
+    数値の列や状態の内容は Python のオブジェクトにコピーせず，必要になったときにページ単位で読み込まれます．
+    """
+    model, _ = read_model(_map_file(path))
+    return model
+
+
+def load_state_keys(path: str) -> TextTable:
+    """
+    ファイルに保存された各状態のメタインタプリタ上の ID を読み込みます．
+    """
+    _, state_keys = read_model(_map_file(path))
+    return state_keys
@@ -1,184 +1,625 @@
 import re
-from collections import Counter, deque
-from typing import List, Tuple
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import accumulate, chain
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence, Tuple
 from type import (
     RawTransition,
     RawState,
     RawLabel,
-    Transition,
     State,
     Label,
-    ModifiedTransition,
+    StateAttributes,
+    StateList,
+    TextSelection,
+    TransitionGraph,
 )
 
+_STATE_ATTRIBUTE_RE = re.compile(
+    r'rule_name\("([^"]+)"\)'
+    r'|action\("([^"]+)"\)'
+    r"|weight\(([\d\.]+)\)"
+    r"|rate\(([\d\.]+)\)"
+    r"|reward\(([\d\.]+)\)"
+)
 
-def normalize(
-    initial_state_id: str,
-    raw_transitions: List[RawTransition],
-    raw_states: List[RawState],
-    raw_labels: List[RawLabel],
-) -> Tuple[List[Transition], List[State], List[Label]]:
+
+def _build_csr(
+    num_states: int, src: "array[int]", dest: "array[int]"
+) -> Tuple["array[int]", "array[int]"]:
     """
-    状態の ID が 0 から昇順になるように正規化します．
+    遷移を src ごとにまとめた CSR 形式の (offsets, dest) を作ります．
+    同じ src の遷移は元の順序を保ちます．src についての計数ソートで，遷移数に対して線形時間です．
+    """
+    offsets = array("q", [0]) * (num_states + 1)
+    for state in src:
+        offsets[state + 1] += 1
+    offsets = array("q", accumulate(offsets))
+
+    position = offsets[:-1]
+    sorted_dest = array("q", [0]) * len(dest)
+    for state, to in zip(src, dest):
+        sorted_dest[position[state]] = to
+        position[state] += 1
+    return offsets, sorted_dest
+
+
+def _offsets_of_sorted(num_states: int, sorted_src: "array[int]") -> "array[int]":
+    """
+    昇順に並んだ src の列から CSR 形式の offsets を作ります．
+    """
+    return array(
+        "q", (bisect_left(sorted_src, state) for state in range(num_states + 1))
+    )
+
+
+def _raw_graph(
+    initial_state_id: str, raw_transitions: List[RawTransition]
+) -> Tuple[Dict[str, int], "array[int]", "array[int]", "array[int]", "array[int]"]:
     """
-    # Build adjacency list for BFS
-    adjacency_list = {}
-    for src, dest in raw_transitions:
-        if src not in adjacency_list:
-            adjacency_list[src] = []
-        adjacency_list[src].append(dest)
-
-    # Perform BFS to assign new state IDs
-    state_id_map = {}
-    queue = deque([initial_state_id])
-    state_id_map[initial_state_id] = 0
+    生の状態 ID を初期状態を 0 とする連番に置き換え，CSR 形式のグラフを作ります．
+
+    Returns:
+        raw_index (Dict[str, int]): 生の状態 ID -> 連番
+        raw_src, raw_dest (array[int]): 入力順の遷移
+        offsets, dest (array[int]): CSR 形式のグラフ
+    """
+    raw_ids = chain.from_iterable(raw_transitions)
+    raw_index: Dict[str, int] = {
+        state_id: i
+        for i, state_id in enumerate(dict.fromkeys(chain([initial_state_id], raw_ids)))
+    }
+    indices = array(
+        "q", map(raw_index.__getitem__, chain.from_iterable(raw_transitions))
+    )
+    raw_src, raw_dest = indices[0::2], indices[1::2]
+    offsets, dest = _build_csr(len(raw_index), raw_src, raw_dest)
+    return raw_index, raw_src, raw_dest, offsets, dest
+
+
+def _bfs_numbering(
+    offsets: "array[int]", dest: "array[int]"
+) -> Tuple["array[int]", int]:
+    """
+    状態 0 からの幅優先探索で到達した順に状態 ID を割り当てます．到達しない状態は -1 です．
+    """
+    state_id_map = array("q", [-1]) * (len(offsets) - 1)
+    queue = deque([0])
+    state_id_map[0] = 0
     next_id = 1
 
     while queue:
         current = queue.popleft()
-        for neighbor in adjacency_list.get(current, []):
-            if neighbor not in state_id_map:
+        for neighbor in dest[offsets[current] : offsets[current + 1]]:
+            if state_id_map[neighbor] < 0:
                 state_id_map[neighbor] = next_id
                 next_id += 1
                 queue.append(neighbor)
 
-    # Normalize and sort transitions
-    normalized_transitions: List[Transition] = sorted(
-        [(state_id_map[src], state_id_map[dest]) for src, dest in raw_transitions],
-        key=lambda x: (x[0], x[1]),
+    return state_id_map, next_id
+
+
+def _renumber(
+    raw_items: List[Tuple[str, str]],
+    raw_index: Dict[str, int],
+    state_id_map: "array[int]",
+) -> List[Tuple[int, str]]:
+    """
+    (生の状態 ID, 値) の列のうち到達可能なものを (新しい状態 ID, 値) に置き換え，新しい状態 ID 順に並べます．
+    """
+    renumbered = []
+    for state_id, value in raw_items:
+        index = raw_index.get(state_id)
+        if index is not None and state_id_map[index] >= 0:
+            renumbered.append((state_id_map[index], value))
+    renumbered.sort(key=itemgetter(0))
+    return renumbered
+
+
+def _collapsed_items(
+    raw_items: List[Tuple[str, str]],
+    raw_index: Dict[str, int],
+    order_key: "array[int]",
+    state_id_map: "array[int]",
+) -> List[Tuple[int, str]]:
+    """
+    (生の状態 ID, 値) の列のうち中間状態を取り除いた後も残るものを (新しい状態 ID, 値) に置き換えます．
+    order_key の順に並べます．modify_transitions と同じ順にするには正規化後の状態 ID を与えます．
+    """
+    kept = []
+    for state_id, value in raw_items:
+        index = raw_index.get(state_id)
+        if index is not None and state_id_map[index] >= 0:
+            kept.append((order_key[index], state_id_map[index], value.strip()))
+    kept.sort(key=itemgetter(0))
+    return [(new_id, value) for _, new_id, value in kept]
+
+
+def _split_states(
+    raw_states: Sequence[Tuple[object, str]],
+) -> Tuple[Sequence, Sequence[str]]:
+    """
+    状態を (状態 ID の列, 内容の列) に分けます．parse_input_stream の結果はコピーせずにそのまま返します．
+    """
+    if isinstance(raw_states, StateList):
+        return raw_states.state_ids, raw_states.texts
+    return [state_id for state_id, _ in raw_states], [
+        content.strip() for _, content in raw_states
+    ]
+
+
+def _collapsed_states(
+    raw_states: Sequence[RawState],
+    raw_index: Dict[str, int],
+    order_key: "array[int]",
+    state_id_map: "array[int]",
+) -> StateList[int]:
+    """
+    状態についての _collapsed_items です．状態の内容はコピーせず，生の状態の内容を位置で参照します．
+    """
+    state_ids, texts = _split_states(raw_states)
+    keys = array("q")
+    positions = array("q")
+    new_ids = array("q")
+    for position, state_id in enumerate(state_ids):
+        index = raw_index.get(state_id)
+        if index is not None and state_id_map[index] >= 0:
+            keys.append(order_key[index])
+            positions.append(position)
+            new_ids.append(state_id_map[index])
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return StateList(
+        array("q", (new_ids[i] for i in order)),
+        TextSelection(texts, array("q", (positions[i] for i in order))),
     )
 
-    # Normalize and sort states
-    normalized_states: List[State] = sorted(
-        [
-            (state_id_map[state_id], state_content)
-            for state_id, state_content in raw_states
-            if state_id in state_id_map
-        ],
-        key=lambda x: x[0],
+
+def normalize(
+    initial_state_id: str,
+    raw_transitions: List[RawTransition],
+    raw_states: Sequence[RawState],
+    raw_labels: List[RawLabel],
+) -> Tuple[TransitionGraph, Sequence[State], List[Label]]:
+    """
+    状態の ID が 0 から昇順になるように正規化します．
+    遷移は (src, dest) の昇順に並んだ CSR 形式のグラフとして返します．
+    """
+    raw_index, raw_src, raw_dest, offsets, dest = _raw_graph(
+        initial_state_id, raw_transitions
     )
+    state_id_map, next_id = _bfs_numbering(offsets, dest)
 
-    # Normalize and sort labels
-    normalized_labels: List[Label] = sorted(
+    # Normalize and sort transitions
+    keys = sorted(
         [
-            (state_id_map[state_id], label)
-            for state_id, label in raw_labels
-            if state_id in state_id_map
-        ],
-        key=lambda x: x[0],
+            state_id_map[src] * next_id + state_id_map[dest]
+            for src, dest in zip(raw_src, raw_dest)
+            if state_id_map[src] >= 0
+        ]
+    )
+    normalized_transitions = TransitionGraph(
+        _offsets_of_sorted(next_id, array("q", [key // next_id for key in keys])),
+        array("q", [key % next_id for key in keys]),
     )
 
+    # Normalize and sort states and labels
+    normalized_states = _collapsed_states(
+        raw_states, raw_index, state_id_map, state_id_map
+    )
+    normalized_labels: List[Label] = _renumber(raw_labels, raw_index, state_id_map)
+
     return normalized_transitions, normalized_states, normalized_labels
 
 
+def parse_state_attributes(state_content: str) -> StateAttributes:
+    """
+    中間状態の内容からルール情報 (rule_name, action, weight, rate, reward) を 1 回の走査で抽出します．
+    それぞれ最初に現れた値を採用し，現れなかった項目は None になります．
+    """
+    values: List[Optional[str]] = [None] * 5
+    remaining = 5
+    for match in _STATE_ATTRIBUTE_RE.finditer(state_content):
+        index = match.lastindex - 1
+        if values[index] is None:
+            values[index] = match.group(match.lastindex)
+            remaining -= 1
+            if remaining == 0:
+                break
+
+    rule_name, action, weight, rate, reward = values
+    return (
+        rule_name,
+        action,
+        None if weight is None else float(weight),
+        None if rate is None else float(rate),
+        None if reward is None else float(reward),
+    )
+
+
+def _merge_state_attributes(
+    previous: StateAttributes, attributes: StateAttributes
+) -> StateAttributes:
+    """
+    同じ (src, dest) に複数の中間状態がある場合に，後から現れた中間状態の値を優先して統合します．
+    """
+    return tuple(old if new is None else new for old, new in zip(previous, attributes))
+
+
+# Collapsed row: (neighbors in order of first appearance, counts, attributes)
+_Row = Tuple[List[int], List[int], List[StateAttributes]]
+
+
+def _collapse_row(
+    offsets: "array[int]",
+    dest: "array[int]",
+    contents: Sequence[Optional[str]],
+    state_attributes: List[Optional[StateAttributes]],
+    current: int,
+) -> _Row:
+    """
+    current から中間状態を 1 つ経由して到達する状態ごとに，遷移数とルール情報をまとめます．
+    到達先は最初に現れた順に並びます．
+    """
+    # neighbor -> position in the row of current
+    row_index: Dict[int, int] = {}
+    row_count: List[int] = []
+    row_attributes: List[StateAttributes] = []
+
+    for way_point in dest[offsets[current] : offsets[current + 1]]:
+        attributes = state_attributes[way_point]
+        if attributes is None:
+            attributes = parse_state_attributes(contents[way_point] or "")
+            state_attributes[way_point] = attributes
+
+        for neighbor in dest[offsets[way_point] : offsets[way_point + 1]]:
+            i = row_index.get(neighbor)
+            if i is None:
+                row_index[neighbor] = len(row_count)
+                row_count.append(1)
+                row_attributes.append(attributes)
+            else:
+                row_count[i] += 1
+                if row_attributes[i] is not attributes:
+                    row_attributes[i] = _merge_state_attributes(
+                        row_attributes[i], attributes
+                    )
+
+    return list(row_index), row_count, row_attributes
+
+
+def _permute_rows(
+    offsets: "array[int]", columns: List["array"], order: List[int]
+) -> Tuple["array[int]", List["array"]]:
+    """
+    CSR 形式の各列の行を order の順に並べ替えます．
+    """
+    new_offsets = array("q", [0])
+    edge_order = array("q")
+    for row in order:
+        start, end = offsets[row], offsets[row + 1]
+        edge_order.extend(range(start, end))
+        new_offsets.append(new_offsets[-1] + end - start)
+    return new_offsets, [
+        array(column.typecode, map(column.__getitem__, edge_order))
+        for column in columns
+    ]
+
+
+class _NumberingChanged(Exception):
+    """
+    以前の状態 ID を保ったままでは連続した状態 ID を割り当てられないことを表します．
+    """
+
+
+def _collapse(
+    offsets: "array[int]",
+    dest: "array[int]",
+    contents: Sequence[Optional[str]],
+    preset_ids: Optional["array[int]"] = None,
+) -> Tuple["array[int]", TransitionGraph]:
+    """
+    状態 0 から中間状態を飛ばして幅優先探索し，中間状態を取り除いた遷移系を作ります．
+    各行の dest は正規化後の状態 ID の昇順に並んでいる必要があります．
+
+    探索は深さごとに行い，各深さの行を探索順にまとめます．
+
+    Args:
+        offsets, dest (array[int]): CSR 形式のグラフ
+        contents (Sequence[Optional[str]]): 各状態の内容
+        preset_ids (Optional[array[int]]):
+            状態 -> 以前の変換での状態 ID (なければ -1)．与えられた場合は以前の状態 ID を保ち，
+            新しい状態には以前の状態 ID の後ろから探索順に状態 ID を割り当てます．
+
+    Returns:
+        state_id_map (array[int]): 状態 -> 新しい状態 ID (到達しない状態は -1)
+        modified_transitions (TransitionGraph): 中間状態を取り除いた遷移系
+
+    Raises:
+        _NumberingChanged: preset_ids の状態のうち到達しないものがある場合
+    """
+    if preset_ids is None:
+        state_id_map = array("q", [-1]) * (len(offsets) - 1)
+        state_id_map[0] = 0  # Ensure the initial state is mapped
+        next_id = 1
+    else:
+        state_id_map = array("q", preset_ids)
+        next_id = max(preset_ids) + 1
+    visited = bytearray(len(offsets) - 1)
+    visited[0] = 1
+    # New state ID of each row, in the order the rows are made
+    row_owners = array("q")
+
+    # Attributes of each way-point state, parsed on first use
+    state_attributes: List[Optional[StateAttributes]] = [None] * len(contents)
+
+    # Columns of the collapsed graph. States are processed in the order of their new IDs,
+    # so each processed state appends exactly one row.
+    modified_offsets = array("q", [0])
+    modified_dest = array("q")
+    modified_count = array("q")
+    modified_weight = array("d")
+    modified_rate = array("d")
+    modified_reward = array("d")
+    modified_action_id = array("q")
+    modified_rule_id = array("q")
+    action_ids: Dict[str, int] = {}
+    rule_ids: Dict[str, int] = {}
+
+    frontier = [0]
+    while frontier:
+        next_frontier = []
+        for current in frontier:
+            neighbors, row_count, row_attributes = _collapse_row(
+                offsets, dest, contents, state_attributes, current
+            )
+            for neighbor in neighbors:
+                if not visited[neighbor]:
+                    visited[neighbor] = 1
+                    if state_id_map[neighbor] < 0:
+                        state_id_map[neighbor] = next_id
+                        next_id += 1
+                    next_frontier.append(neighbor)
+            row_owners.append(state_id_map[current])
+
+            for neighbor, count, (rule_name, action, weight, rate, reward) in zip(
+                neighbors, row_count, row_attributes
+            ):
+                modified_dest.append(state_id_map[neighbor])
+                modified_count.append(count)
+                modified_rule_id.append(
+                    rule_ids.setdefault(
+                        "UNKNOWN" if rule_name is None else rule_name,
+                        len(rule_ids),
+                    )
+                )
+                modified_action_id.append(
+                    action_ids.setdefault(
+                        "UNKNOWN" if action is None else action, len(action_ids)
+                    )
+                )
+                modified_weight.append(1.0 if weight is None else weight)
+                modified_rate.append(1.0 if rate is None else rate)
+                modified_reward.append(0.0 if reward is None else reward)
+            modified_offsets.append(len(modified_dest))
+        frontier = next_frontier
+
+    if preset_ids is not None:
+        if len(row_owners) != next_id:
+            raise _NumberingChanged()
+        # Rows were made in the order of the search, not of the state IDs
+        order = sorted(range(len(row_owners)), key=row_owners.__getitem__)
+        modified_offsets, (
+            modified_dest,
+            modified_count,
+            modified_weight,
+            modified_rate,
+            modified_reward,
+            modified_action_id,
+            modified_rule_id,
+        ) = _permute_rows(
+            modified_offsets,
+            [
+                modified_dest,
+                modified_count,
+                modified_weight,
+                modified_rate,
+                modified_reward,
+                modified_action_id,
+                modified_rule_id,
+            ],
+            order,
+        )
+
+    modified_transitions = TransitionGraph(
+        modified_offsets,
+        modified_dest,
+        count=modified_count,
+        weight=modified_weight,
+        rate=modified_rate,
+        reward=modified_reward,
+        action_id=modified_action_id,
+        rule_id=modified_rule_id,
+        actions=list(action_ids),
+        rules=list(rule_ids),
+    )
+    return state_id_map, modified_transitions
+
+
 def modify_transitions(
-    transitions: List[Transition], states: List[State], labels: List[Label]
-) -> Tuple[int, int, List[ModifiedTransition], List[State], List[Label]]:
+    transitions: TransitionGraph,
+    states: Sequence[State],
+    labels: List[Label],
+) -> Tuple[int, int, TransitionGraph, Sequence[State], List[Label]]:
     """
     ルール情報などの付加のために追加されて中間ステップを削除した遷移系を生成する
 
     Args:
-        transitions (list[tuple[int, int]]): 遷移
-        states (list[tuple[int, str]]): 状態
+        transitions (TransitionGraph): 正規化された遷移
+        states (Sequence[tuple[int, str]]): 状態
+        labels (list[tuple[int, str]]): ラベル
 
     Returns:
         n (int): 状態数
         t (int): 遷移数
-        modified_transitions (list[tuple[int, int, int, str, str, float, float, float]]):
-            遷移 (src, dest, count, rule_name, action, weight, rate, reward)
-        modified_states (list[tuple[int, str]]): 状態
+        modified_transitions (TransitionGraph):
+            遷移 (dest, count, rule_name, action, weight, rate, reward) を持つ CSR 形式のグラフ
+        modified_states (Sequence[tuple[int, str]]): 状態 (StateList)
         modified_labels (list[tuple[int, str]]): ラベル
     """
+    state_ids, contents = _split_states(states)
+    state_id_map, modified_transitions = _collapse(
+        transitions.offsets, transitions.dest, contents
+    )
 
-    new_transitions = []
+    kept = array(
+        "q",
+        (
+            position
+            for position, state_id in enumerate(state_ids)
+            if state_id_map[state_id] >= 0
+        ),
+    )
+    modified_states = StateList(
+        array("q", (state_id_map[state_ids[position]] for position in kept)),
+        TextSelection(contents, kept),
+    )
 
-    # Build adjacency list for BFS
-    adjacency_list = {}
-    for src, dest in transitions:
-        if src not in adjacency_list:
-            adjacency_list[src] = []
-        adjacency_list[src].append(dest)
+    modified_labels: List[Label] = []
+    for state_id, label in labels:
+        if state_id_map[state_id] >= 0:
+            modified_labels.append((state_id_map[state_id], label.strip()))
 
-    state_id_map = {}
-    queue = deque([0])
-    state_id_map[0] = 0  # Ensure the initial state is mapped
-    next_id = 1
+    return (
+        modified_transitions.num_states,
+        modified_transitions.num_edges,
+        modified_transitions,
+        modified_states,
+        modified_labels,
+    )
 
-    tra_rule_map = {}
-    tra_action_map = {}
-    tra_weight_map = {}
-    tra_rate_map = {}
-    tra_reward_map = {}
 
-    while queue:
-        current = queue.popleft()
-        for way_point in adjacency_list.get(current, []):
-            for neighbor in adjacency_list.get(way_point, []):
-                new_transitions.append((current, neighbor))
-
-                state_content = states[int(way_point)][1]
-
-                # rule_name
-                rule_name_match = re.search(r'rule_name\("([^"]+)"\)', state_content)
-                if rule_name_match:
-                    rule_name = rule_name_match.group(1)
-                    tra_rule_map[(current, neighbor)] = rule_name
-
-                # action
-                action_match = re.search(r'action\("([^"]+)"\)', state_content)
-                if action_match:
-                    action = action_match.group(1)
-                    tra_action_map[(current, neighbor)] = action
-
-                # weight
-                weight_match = re.search(r"weight\(([\d\.]+)\)", state_content)
-                if weight_match:
-                    weight = float(weight_match.group(1))
-                    tra_weight_map[(current, neighbor)] = weight
-
-                # rate
-                rate_match = re.search(r"rate\(([\d\.]+)\)", state_content)
-                if rate_match:
-                    rate = float(rate_match.group(1))
-                    tra_rate_map[(current, neighbor)] = rate
-
-                # reward
-                reward_match = re.search(r"reward\(([\d\.]+)\)", state_content)
-                if reward_match:
-                    reward = float(reward_match.group(1))
-                    tra_reward_map[(current, neighbor)] = reward
-
-                if neighbor not in state_id_map:
-                    state_id_map[neighbor] = next_id
-                    next_id += 1
-                    queue.append(neighbor)
-
-    n = len(state_id_map)
-    t = len(Counter(new_transitions))
-
-    modified_transitions: List[ModifiedTransition] = []
-    for (src, dest), count in Counter(new_transitions).items():
-        modified_transitions.append(
-            (
-                state_id_map.get(src, "UNKNOWN"),
-                state_id_map.get(dest, "UNKNOWN"),
-                count,
-                tra_rule_map.get((src, dest), "UNKNOWN"),
-                tra_action_map.get((src, dest), "UNKNOWN"),
-                tra_weight_map.get((src, dest), 1.0),
-                tra_rate_map.get((src, dest), 1.0),
-                tra_reward_map.get((src, dest), 0.0),
-            )
-        )
+def _prepare_collapse(
+    initial_state_id: str,
+    raw_transitions: List[RawTransition],
+    raw_states: Sequence[RawState],
+) -> Tuple[Dict[str, int], "array[int]", "array[int]", "array[int]", TextSelection]:
+    """
+    生の状態 ID のグラフを作り，中間状態の除去に必要な形に整えます．
 
-    modified_states: List[State] = []
-    for state_id, state_content in states:
-        if state_id in state_id_map:
-            modified_states.append((state_id_map[state_id], state_content.strip()))
+    Returns:
+        raw_index (Dict[str, int]): 生の状態 ID -> 連番
+        offsets, dest (array[int]): 各行を正規化後の状態 ID 順に並べた CSR 形式のグラフ
+        normalized_id (array[int]): 連番 -> 正規化後の状態 ID
+        contents (TextSelection): 連番 -> 状態の内容 (内容のない状態は None)
+    """
+    raw_index, _, _, offsets, dest = _raw_graph(initial_state_id, raw_transitions)
+    normalized_id, _ = _bfs_numbering(offsets, dest)
 
-    modified_labels: List[Label] = []
-    for state_id, label in labels:
-        if state_id in state_id_map:
-            modified_labels.append((state_id_map[state_id], label.strip()))
+    # Order each row by normalized ID, as the rows of the normalized graph are. Rows
+    # are short, so sorting each one is faster than a counting sort of all edges.
+    # Rows of unreachable states are sorted as well, but are never read.
+    key = normalized_id.__getitem__
+    for start, end in zip(offsets, offsets[1:]):
+        if end - start > 1:
+            dest[start:end] = array("q", sorted(dest[start:end], key=key))
+
+    # Refer to the first content of each state by its position among the raw states
+    state_ids, texts = _split_states(raw_states)
+    positions = array("q", [-1]) * len(raw_index)
+    for position, state_id in enumerate(state_ids):
+        index = raw_index.get(state_id)
+        if index is not None and positions[index] < 0:
+            positions[index] = position
+
+    return raw_index, offsets, dest, normalized_id, TextSelection(texts, positions)
+
+
+def normalize_and_modify(
+    initial_state_id: str,
+    raw_transitions: List[RawTransition],
+    raw_states: Sequence[RawState],
+    raw_labels: List[RawLabel],
+) -> Tuple[int, int, TransitionGraph, Sequence[State], List[Label]]:
+    """
+    normalize と modify_transitions を 1 回の処理で行います．
+    正規化した遷移系を作らずに生の状態 ID のグラフ上で中間状態を取り除くため，
+    正規化後の遷移・状態・ラベルの整列済みコピーを持ちません．結果は 2 段階で処理した場合と同じです．
+
+    Returns:
+        modify_transitions と同じ
+    """
+    raw_index, offsets, dest, normalized_id, contents = _prepare_collapse(
+        initial_state_id, raw_transitions, raw_states
+    )
+    state_id_map, modified_transitions = _collapse(offsets, dest, contents)
+
+    return (
+        modified_transitions.num_states,
+        modified_transitions.num_edges,
+        modified_transitions,
+        _collapsed_states(raw_states, raw_index, normalized_id, state_id_map),
+        _collapsed_items(raw_labels, raw_index, normalized_id, state_id_map),
+    )
+
+
+def modify_incrementally(
+    initial_state_id: str,
+    raw_transitions: List[RawTransition],
+    raw_states: Sequence[RawState],
+    raw_labels: List[RawLabel],
+    previous_keys: Sequence[str],
+) -> Tuple[Tuple[int, int, TransitionGraph, Sequence[State], List[Label]], List[str]]:
+    """
+    以前の変換結果の状態 ID をできるだけ保ったまま normalize_and_modify を行います．
+
+    以前の状態はすべて以前と同じ状態 ID になり，新しく現れた状態には以前の状態 ID の後ろから探索順に
+    状態 ID を割り当てます．初期状態が変わった場合や以前の状態の一部に到達しなくなった場合は，
+    連続した状態 ID を保てないため normalize_and_modify と同じ番号付けに戻します．
+
+    Args:
+        previous_keys (Sequence[str]): 以前の変換結果の状態 ID -> メタインタプリタ上の ID
 
-    return n, t, modified_transitions, modified_states, modified_labels
+    Returns:
+        model: normalize_and_modify と同じ
+        state_keys (List[str]): 状態 ID -> メタインタプリタ上の ID．次回の変換に渡します
+    """
+    raw_index, offsets, dest, normalized_id, contents = _prepare_collapse(
+        initial_state_id, raw_transitions, raw_states
+    )
+
+    preset_ids: Optional["array[int]"] = None
+    if len(previous_keys) > 0 and previous_keys[0] == initial_state_id:
+        preset_ids = array("q", [-1]) * len(raw_index)
+        for state_id, key in enumerate(previous_keys):
+            index = raw_index.get(key)
+            if index is None:
+                preset_ids = None
+                break
+            preset_ids[index] = state_id
+
+    try:
+        state_id_map, modified_transitions = _collapse(
+            offsets, dest, contents, preset_ids
+        )
+        # States are listed in the order of their (stable) IDs
+        order_key = state_id_map if preset_ids is not None else normalized_id
+    except _NumberingChanged:
+        state_id_map, modified_transitions = _collapse(offsets, dest, contents)
+        order_key = normalized_id
+
+    raw_ids = list(raw_index)
+    state_keys = [""] * modified_transitions.num_states
+    for index, state_id in enumerate(state_id_map):
+        if state_id >= 0:
+            state_keys[state_id] = raw_ids[index]
+
+    model = (
+        modified_transitions.num_states,
+        modified_transitions.num_edges,
+        modified_transitions,
+        _collapsed_states(raw_states, raw_index, order_key, state_id_map),
+        _collapsed_items(raw_labels, raw_index, order_key, state_id_map),
+    )
+    return model, state_keys
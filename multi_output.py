@@ -0,0 +1,182 @@
+import os
+import sys
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+from model_store import Model
+from transition_generator import generate_dtmc, generate_mdp, generate_ctmc
+from output import (
+    open_output,
+    output_modified_results,
+    output_dtmc,
+    output_mdp,
+    output_ctmc,
+    output_labels,
+    output_trew,
+    output_dtmc_for_state_viewer,
+    output_mdp_for_state_viewer,
+    output_ctmc_for_state_viewer,
+)
+from lib.lazy_numpy import load_numpy
+from sparse_output import (
+    open_binary_output,
+    output_matrix_market,
+    output_npz,
+    sparse_matrix,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+Emit = Tuple[str, str]  # (kind, path)
+
+GENERATORS: Dict[str, Callable] = {
+    "dtmc": generate_dtmc,
+    "mdp": generate_mdp,
+    "ctmc": generate_ctmc,
+}
+
+# Output kind -> model type whose generated transitions the output needs
+KINDS: Dict[str, Optional[str]] = {
+    "dtmc.tra": "dtmc",
+    "mdp.tra": "mdp",
+    "ctmc.tra": "ctmc",
+    "lab": None,
+    "trew": None,
+    "dtmc.viewer": "dtmc",
+    "mdp.viewer": "mdp",
+    "ctmc.viewer": "ctmc",
+    "modified": None,
+    "dtmc.mtx": "dtmc",
+    "mdp.mtx": "mdp",
+    "ctmc.mtx": "ctmc",
+    "dtmc.npz": "dtmc",
+    "mdp.npz": "mdp",
+    "ctmc.npz": "ctmc",
+}
+
+# Output kinds that write state contents
+CONTENT_KINDS = {"dtmc.viewer", "mdp.viewer", "ctmc.viewer", "modified"}
+
+# Output kinds written in binary mode
+BINARY_KINDS = {"dtmc.npz", "mdp.npz", "ctmc.npz"}
+
+# Model shared with the workers. Forked workers inherit it without pickling.
+_model: Optional[Model] = None
+
+
+def parse_emit(spec: str) -> Emit:
+    """
+    KIND=PATH 形式の出力指定を (KIND, PATH) に変換します．PATH が "-" の場合は標準出力です．
+    """
+    kind, separator, path = spec.partition("=")
+    if not separator or not path:
+        raise ValueError(f"Error: Invalid output specification '{spec}'.")
+    if kind not in KINDS:
+        raise ValueError(
+            f"Error: Unknown output kind '{kind}'. Choose from {', '.join(KINDS)}."
+        )
+    if kind in BINARY_KINDS and load_numpy() is None:
+        raise ValueError(f"Error: NumPy is required for the output kind '{kind}'.")
+    return kind, path
+
+
+def _write(
+    kind: str, model: Model, generated: Optional[list], out: Union[TextIO, BinaryIO]
+) -> None:
+    n, t, transitions, states, labels = model
+    if kind.endswith((".mtx", ".npz")):
+        matrix = sparse_matrix(n, KINDS[kind], generated)
+        if kind.endswith(".mtx"):
+            output_matrix_market(n, matrix, out)
+        else:
+            output_npz(n, matrix, out)
+        return
+    if kind == "dtmc.tra":
+        output_dtmc(n, t, generated, out)
+    elif kind == "mdp.tra":
+        output_mdp(n, t, generated, out)
+    elif kind == "ctmc.tra":
+        output_ctmc(n, t, generated, out)
+    elif kind == "lab":
+        output_labels(labels, out)
+    elif kind == "trew":
+        output_trew(t, transitions, out)
+    elif kind == "dtmc.viewer":
+        output_dtmc_for_state_viewer(n, t, transitions, states, generated, labels, out)
+    elif kind == "mdp.viewer":
+        output_mdp_for_state_viewer(n, t, transitions, states, generated, labels, out)
+    elif kind == "ctmc.viewer":
+        output_ctmc_for_state_viewer(n, t, transitions, states, generated, labels, out)
+    elif kind == "modified":
+        output_modified_results(n, t, transitions, states, labels, out)
+
+
+def _write_group(model_type: Optional[str], emits: List[Emit]) -> None:
+    """
+    同じモデル種別の遷移を必要とする出力をまとめて書き出します．遷移の生成は 1 度だけ行います．
+    """
+    generated = None if model_type is None else GENERATORS[model_type](_model[2])
+    for kind, path in emits:
+        opener = open_binary_output if kind in BINARY_KINDS else open_output
+        with opener(path) as f:
+            _write(kind, _model, generated, f)
+
+
+def _executor(jobs: int) -> "Executor":
+    # Imported here, as multiprocessing is slow to import and only needed for parallel
+    # outputs
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    # Fork so that the workers share the model instead of receiving a pickled copy
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(jobs)
+
+
+def write_outputs(model: Model, emits: List[Emit], jobs: Optional[int] = 1) -> None:
+    """
+    1 つの遷移系から複数の出力を並列に書き出します．
+    遷移の生成はモデル種別ごとに 1 度だけ行い，モデル種別ごとに別のワーカーで処理します．
+
+    Args:
+        model: 中間状態を取り除いた遷移系 (n, t, transitions, states, labels)
+        emits (List[Emit]): (出力の種類, 出力先) のリスト
+        jobs (Optional[int]): ワーカー数．None または 0 の場合は CPU 数，1 の場合は並列化しません
+    """
+    if sum(1 for _, path in emits if path == "-") > 1:
+        raise ValueError("Error: Only one output can be written to stdout.")
+
+    groups: Dict[Optional[str], List[Emit]] = {}
+    for kind, path in emits:
+        groups.setdefault(KINDS[kind], []).append((kind, path))
+
+    global _model
+    _model = model
+    try:
+        jobs = min(jobs or os.cpu_count() or 1, len(groups))
+        if jobs <= 1:
+            for model_type, group in groups.items():
+                _write_group(model_type, group)
+            return
+
+        # Nothing buffered before the fork may be written twice
+        sys.stdout.flush()
+        with _executor(jobs) as executor:
+            futures = [
+                executor.submit(_write_group, model_type, group)
+                for model_type, group in groups.items()
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        _model = None
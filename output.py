@@ -1,123 +1,235 @@
-from collections import Counter
-from typing import Dict, List, Tuple
-from lib.round_sig_6 import round_sig_6
+import io
+import os
+import sys
+from contextlib import contextmanager
+from array import array
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    TypeVar,
+)
+from lib.round_sig_6 import round_sig_6_batch
 from type import (
-    Transition,
     State,
     Label,
     ModifiedTransition,
+    TransitionGraph,
     TransitionForDTMC,
     TransitionForMDP,
     TransitionForCTMC,
 )
+from transition_generator import mdp_choice_offsets
+from viewer_index import write_index
+
+# Number of rows formatted and written at once
+BATCH_SIZE = 1 << 14
+# Buffer size of output files
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Characters joined into one write at most, as state contents can be long
+WRITE_CHUNK_SIZE = 1 << 22
+
+T = TypeVar("T")
+
+
+@contextmanager
+def open_output(path: Optional[str]) -> Iterator[TextIO]:
+    """
+    出力先のファイルを開きます．path が None または "-" の場合は標準出力に書き出します．
+    名前付きパイプを指定すると，読み手が生成中の出力を順に読み進められます．
+    """
+    if path is None or path == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+        return
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", buffering=OUTPUT_BUFFER_SIZE) as f:
+        yield f
+
+
+def _batches(items: Iterable[T]) -> Iterator[List[T]]:
+    """
+    items を BATCH_SIZE 個ずつのリストに区切って返します．
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_lines(out: TextIO, lines: Iterable[str]) -> None:
+    """
+    各行を BATCH_SIZE 行ずつまとめて書き出します．
+    """
+    for batch in _batches(lines):
+        batch.append("")
+        out.write("\n".join(batch))
 
 
-def output_results(n, t, transitions: List[Transition], states: List[State]) -> None:
+def _write_state_lines(out: TextIO, lines: Iterable[str]) -> None:
+    """
+    状態の内容を含む行を _write_lines と同様にまとめて書き出します．
+    状態の内容は長くなりうるため，合計 WRITE_CHUNK_SIZE 文字程度ごとにも書き出し，
+    まとめる文字列の大きさを状態の内容の大きさによらず抑えます．
+    """
+    batch: List[str] = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if len(batch) >= BATCH_SIZE or size >= WRITE_CHUNK_SIZE:
+            batch.append("")
+            out.write("\n".join(batch))
+            batch = []
+            size = 0
+    if batch:
+        batch.append("")
+        out.write("\n".join(batch))
+
+
+def output_results(
+    n, t, transitions: TransitionGraph, states: List[State], out: TextIO
+) -> None:
     # Print state and transition counts in one line
-    print(f"{n} {t}")
+    out.write(f"{n} {t}\n")
 
     # Print transitions with new state IDs, sorted by source and destination IDs
-    transition_counter = Counter(transitions)
-    for (src, dest), count in transition_counter.items():
-        print(f"{src} {dest} {count}")
+    _write_lines(
+        out,
+        (
+            f"{src} {dest} {sum(1 for _ in group)}"
+            for (src, dest), group in groupby(transitions.edges())
+        ),
+    )
 
     # Print states with new state IDs, sorted by new state ID
-    for state_id, state_content in states:
-        print(f"{state_id} {{{state_content.strip()}}}")
+    _write_state_lines(
+        out,
+        (f"{state_id} {{{content.strip()}}}" for state_id, content in states),
+    )
 
 
 def output_modified_results(
     n,
     t,
-    transitions: List[ModifiedTransition],
+    transitions: TransitionGraph,
     states: List[State],
     labels: List[Label],
+    out: TextIO,
 ) -> None:
     # Print state and transition counts in one line
-    print("nodes transitions")
-    print(f"{n} {t}")
+    out.write("nodes transitions\n")
+    out.write(f"{n} {t}\n")
 
     # Print modified transitions with new state IDs, sorted by source and destination IDs
-    print("\nsrc dest count rule_name action weight rate reward")
-    for src, dest, count, rule_name, action, weight, rate, reward in transitions:
-        print(f"{src} {dest} {count} {rule_name} {action} {weight} {rate} {reward}")
+    # Each row is (src, dest, count, rule_name, action, weight, rate, reward)
+    out.write("\nsrc dest count rule_name action weight rate reward\n")
+    _write_lines(
+        out, (" ".join(map(str, row)) for row in transitions.modified_transitions())
+    )
 
     # Print states with new state IDs, sorted by new state ID
-    print("\nstate_id state_content")
-    for state_id, state_content in states:
-        print(f"{state_id} {{{state_content.strip()}}}")
+    out.write("\nstate_id state_content\n")
+    _write_state_lines(
+        out,
+        (f"{state_id} {{{content.strip()}}}" for state_id, content in states),
+    )
 
     # Print labels
-    print("\nstate_id label")
-    for state_id, label in labels:
-        print(f"{state_id} {label}")
+    out.write("\nstate_id label\n")
+    _write_lines(out, (f"{state_id} {label}" for state_id, label in labels))
 
 
-def output_dtmc(n: int, t: int, prob_transitions: List[TransitionForDTMC]) -> None:
+def output_dtmc(
+    n: int, t: int, prob_transitions: List[TransitionForDTMC], out: TextIO
+) -> None:
     """
     遷移確率データを指定された形式で出力します。
 
     Args:
-        prob_transitions (List[ProbTransition]): 確率付き遷移系
+        prob_transitions (List[ProbTransition]): (開始状態, 終了状態) 順に並んだ確率付き遷移系
+        out (TextIO): 出力先
     """
-    # Prepare output
-    output_lines = []
-    output_lines.append(f"{n} {t}")
-    for from_state, to_state, prob in sorted(prob_transitions):
-        prob_str = round_sig_6(prob)
-        output_lines.append(f"{from_state} {to_state} {prob_str}")
-
-    # Print output
-    print("\n".join(output_lines))
+    out.write(f"{n} {t}\n")
+    for batch in _batches(prob_transitions):
+        prob_strs = round_sig_6_batch([prob for _, _, prob in batch])
+        _write_lines(
+            out,
+            (
+                f"{from_state} {to_state} {prob_str}"
+                for (from_state, to_state, _), prob_str in zip(batch, prob_strs)
+            ),
+        )
 
 
-def output_mdp(n: int, t: int, mdp_transitions: List[TransitionForMDP]) -> None:
+def output_mdp(
+    n: int, t: int, mdp_transitions: List[TransitionForMDP], out: TextIO
+) -> None:
     """
     MDP遷移確率データを指定された形式で出力します。
 
     Args:
-        mdp_transitions (List[TransitionForMDP]): MDP遷移系
+        mdp_transitions (List[TransitionForMDP]): (開始状態, 選択, 終了状態) 順に並んだMDP遷移系
+        out (TextIO): 出力先
     """
-    # Prepare output
-    output_lines = []
-    choice_count = 0
-    choice_bf = -1
-
-    for from_state, choice_id, to_state, prob, _ in sorted(mdp_transitions):
-        prob_str = round_sig_6(prob)
-        if choice_id != choice_bf:
-            choice_count += 1
-            choice_bf = choice_id
-        output_lines.append(f"{from_state} {choice_id} {to_state} {prob_str}")
-
-    # Print output
-    print(f"{n} {choice_count} {t}")
-    print("\n".join(output_lines))
+    # Choice IDs restart from 0 in each state, so the total is the last choice offset
+    choice_count = mdp_choice_offsets(n, mdp_transitions)[n]
+
+    out.write(f"{n} {choice_count} {t}\n")
+    for batch in _batches(mdp_transitions):
+        prob_strs = round_sig_6_batch([prob for _, _, _, prob, _ in batch])
+        _write_lines(
+            out,
+            (
+                f"{from_state} {choice_id} {to_state} {prob_str}"
+                for (from_state, choice_id, to_state, _, _), prob_str in zip(
+                    batch, prob_strs
+                )
+            ),
+        )
 
 
-def output_ctmc(n: int, t: int, rate_transitions: List[TransitionForCTMC]) -> None:
+def output_ctmc(
+    n: int, t: int, rate_transitions: List[TransitionForCTMC], out: TextIO
+) -> None:
     """
     遷移率データを指定された形式で出力します。
 
     Args:
-        rate_transitions (List[TransitionForCTMC]): レート付き遷移系
+        rate_transitions (List[TransitionForCTMC]): (開始状態, 終了状態) 順に並んだレート付き遷移系
+        out (TextIO): 出力先
     """
-    # Prepare output
-    output_lines = []
-    output_lines.append(f"{n} {t}")
-    for from_state, to_state, rate in sorted(rate_transitions):
-        output_lines.append(f"{from_state} {to_state} {rate}")
-
-    # Print output
-    print("\n".join(output_lines))
+    out.write(f"{n} {t}\n")
+    _write_lines(
+        out,
+        (
+            f"{from_state} {to_state} {rate}"
+            for from_state, to_state, rate in rate_transitions
+        ),
+    )
 
 
-def output_labels(labels: List[Label]) -> None:
+def output_labels(labels: List[Label], out: TextIO) -> None:
     """
     ラベルデータを出力します。
 
     Args:
         labels (List[Label]): ラベルデータ
+        out (TextIO): 出力先
     """
     # Create a dictionary to store labels for each state
     labelId2LabelStr: Dict[int, str] = {0: "init"}  # Default label
@@ -140,41 +252,69 @@ def output_labels(labels: List[Label]) -> None:
     label_strings = [
         f'{label_id}="{label}"' for label_id, label in sorted(labelId2LabelStr.items())
     ]
-    print(" ".join(label_strings))
+    out.write(" ".join(label_strings) + "\n")
 
     # Output state-to-label mapping in the format: 0: 0
-    for state_id in sorted(stateId2LabelIds.keys()):
-        print(
+    _write_lines(
+        out,
+        (
             f"{state_id}: "
             + " ".join(str(label_id) for label_id in stateId2LabelIds[state_id])
-        )
+            for state_id in sorted(stateId2LabelIds.keys())
+        ),
+    )
 
 
-def output_trew(t: int, transitions: List[ModifiedTransition]) -> None:
+def output_trew(t: int, transitions: TransitionGraph, out: TextIO) -> None:
     """
     報酬付き遷移データを指定された形式で出力します。
 
     Args:
         t (int): 遷移数
-        transitions (List[ModifiedTransition]): 変更された遷移
+        transitions (TransitionGraph): 変更された遷移
+        out (TextIO): 出力先
     """
-    trew = []
-    for src, dest, _, _, _, _, _, reward in transitions:
-        if reward == 0.0:
-            continue
-        reward_str = round_sig_6(reward)
-        trew.append(f"{src} {dest} {reward_str}")
+    # Count rewarded transitions for the header
+    reward_count = sum(1 for reward in transitions.reward if reward != 0.0)
+    out.write(f"{t} {reward_count}\n")
+
+    rewards = (
+        (src, dest, reward)
+        for src, dest, _, _, _, _, _, reward in transitions.modified_transitions()
+        if reward != 0.0
+    )
+    for batch in _batches(rewards):
+        reward_strs = round_sig_6_batch([reward for _, _, reward in batch])
+        _write_lines(
+            out,
+            (
+                f"{src} {dest} {reward_str}"
+                for (src, dest, _), reward_str in zip(batch, reward_strs)
+            ),
+        )
+
 
-    print(f"{t} {len(trew)}\n" + "\n".join(trew))
+def output_state_mapping(block_of: Sequence[int], out: TextIO) -> None:
+    """
+    元の状態 ID から最小化した商モデルの状態 ID への対応を出力します．
+
+    Args:
+        block_of (Sequence[int]): 元の状態 ID -> 商モデルの状態 ID
+        out (TextIO): 出力先
+    """
+    out.write("state quotient_state\n")
+    _write_lines(out, (f"{state} {block}" for state, block in enumerate(block_of)))
 
 
 def output_dtmc_for_state_viewer(
     n: int,
     t: int,
-    transitions: List[ModifiedTransition],
+    transitions: TransitionGraph,
     states: List[State],
     dtmc_transitions: List[TransitionForDTMC],
     labels: List[Label],
+    out: TextIO,
+    index: Optional[BinaryIO] = None,
 ) -> None:
     """
     状態ビューア用の出力を生成します。
@@ -182,87 +322,188 @@ def output_dtmc_for_state_viewer(
     Args:
         n (int): 状態数
         t (int): 遷移数
-        transitions (List[ModifiedTransition]): 変更された遷移
+        transitions (TransitionGraph): 変更された遷移
         states (List[State]): 状態
         prob_transitions (List[ProbTransition]): 確率付き遷移系
+        out (TextIO): 出力先
+        index (Optional[BinaryIO]): 与えた場合，各状態とその遷移の出力中の位置の索引を書き出します
     """
-    # Print state and transition counts in one line
-    print(f"{n} {t}")
 
-    # (src, dest) -> probability map
-    prob_map: Dict[Tuple[int, int], float] = {}
-    for from_state, to_state, prob in dtmc_transitions:
-        prob_map[(from_state, to_state)] = prob
+    def lines() -> Iterator[str]:
+        for batch, prob_map in _batches_with_values(
+            transitions, dtmc_transitions, itemgetter(0, 1), itemgetter(2)
+        ):
+            prob_strs = round_sig_6_batch(
+                [prob_map.get((src, dest), 0.0) for src, dest, *_ in batch]
+            )
+            yield from (
+                f"{src} {dest} {rule_name} {prob_str}"
+                for (src, dest, _, rule_name, *_), prob_str in zip(batch, prob_strs)
+            )
 
-    # Print modified transitions with new state IDs, sorted by source and destination IDs
-    for src, dest, _, rule_name, _, _, _, _ in transitions:
-        prob_str = round_sig_6(prob_map.get((src, dest), 0.0))
-        print(f"{src} {dest} {rule_name} {prob_str}")
-
-    # Print states with new state IDs, sorted by new state ID
-    printStates(labels, states)
+    _write_state_viewer(n, t, transitions, lines(), labels, states, out, index)
 
 
 def output_mdp_for_state_viewer(
     n: int,
     t: int,
-    transitions: List[ModifiedTransition],
+    transitions: TransitionGraph,
     states: List[State],
     mdp_transitions: List[TransitionForMDP],
     labels: List[Label],
+    out: TextIO,
+    index: Optional[BinaryIO] = None,
 ) -> None:
     """
     状態ビューア用のMDP出力を生成します。
     """
-    print(f"{n} {t}")
-
-    # (src, action, dest) -> probability map
-    prob_map: Dict[Tuple[int, str, int], float] = {}
-    for from_state, _, to_state, prob, action in mdp_transitions:
-        prob_map[(from_state, action, to_state)] = prob
 
-    # Print modified transitions with new state IDs, sorted by source and destination IDs
-    for src, dest, _, rule_name, action, _, _, _ in transitions:
-        prob_str = round_sig_6(prob_map.get((src, action, dest), 0.0))
-        print(f"{src} {dest} {rule_name} {action},{prob_str}")
-
-    # Print states with new state IDs, sorted by new state ID
-    printStates(labels, states)
+    def lines() -> Iterator[str]:
+        for batch, prob_map in _batches_with_values(
+            transitions, mdp_transitions, itemgetter(0, 4, 2), itemgetter(3)
+        ):
+            prob_strs = round_sig_6_batch(
+                [
+                    prob_map.get((src, action, dest), 0.0)
+                    for src, dest, _, _, action, *_ in batch
+                ]
+            )
+            yield from (
+                f"{src} {dest} {rule_name} {action},{prob_str}"
+                for (src, dest, _, rule_name, action, *_), prob_str in zip(
+                    batch, prob_strs
+                )
+            )
+
+    _write_state_viewer(n, t, transitions, lines(), labels, states, out, index)
 
 
 def output_ctmc_for_state_viewer(
     n: int,
     t: int,
-    transitions: List[ModifiedTransition],
+    transitions: TransitionGraph,
     states: List[State],
     ctmc_transitions: List[TransitionForCTMC],
     labels: List[Label],
+    out: TextIO,
+    index: Optional[BinaryIO] = None,
 ) -> None:
     """
     状態ビューア用のCTMC出力を生成します。
     """
-    print(f"{n} {t}")
 
-    # (src, dest) -> rate map
-    rate_map: Dict[Tuple[int, int], float] = {}
-    for from_state, to_state, rate in ctmc_transitions:
-        rate_map[(from_state, to_state)] = rate
+    def lines() -> Iterator[str]:
+        for batch, rate_map in _batches_with_values(
+            transitions, ctmc_transitions, itemgetter(0, 1), itemgetter(2)
+        ):
+            yield from (
+                f"{src} {dest} {rule_name} {rate_map.get((src, dest), 1.0)}"
+                for src, dest, _, rule_name, *_ in batch
+            )
 
-    # Print modified transitions with new state IDs, sorted by source and destination IDs
-    for src, dest, _, rule_name, _, _, _, _ in transitions:
-        print(f"{src} {dest} {rule_name} {rate_map.get((src, dest), 1.0)}")
+    _write_state_viewer(n, t, transitions, lines(), labels, states, out, index)
 
-    # Print states with new state IDs, sorted by new state ID
-    printStates(labels, states)
 
-
-def printStates(labels: List[Label], states: List[State]) -> None:
+def _batches_with_values(
+    transitions: TransitionGraph, generated: list, key: Callable, value: Callable
+) -> Iterator[Tuple[List[ModifiedTransition], Dict]]:
+    """
+    遷移を BATCH_SIZE 個ずつ区切って，区切りごとに，その開始状態から生成した遷移の key -> value の辞書と組にして返します．
+    生成した遷移は開始状態の順に並んでいるため，遷移全体の辞書を作らずに区切りの分だけを保持します．
     """
-    状態とラベルを標準出力に出力します。
+    start = 0
+    for batch in _batches(transitions.modified_transitions()):
+        first, last = batch[0][0], batch[-1][0]
+        while start < len(generated) and generated[start][0] < first:
+            start += 1
+        end = start
+        while end < len(generated) and generated[end][0] <= last:
+            end += 1
+        yield batch, {key(row): value(row) for row in generated[start:end]}
 
-    Args:
-        labels (List[Label]): ラベルデータ
-        states (List[State]): 状態データ
+
+def _utf8_size(line: str) -> int:
+    return len(line) if line.isascii() else len(line.encode())
+
+
+def _write_state_viewer(
+    n: int,
+    t: int,
+    transitions: TransitionGraph,
+    rows: Iterable[str],
+    labels: List[Label],
+    states: List[State],
+    out: TextIO,
+    index: Optional[BinaryIO],
+) -> None:
+    """
+    状態数と遷移数の行，transitions の各遷移の行 rows，状態の行を順に書き出します．
+    index を与えた場合は各行のバイト位置を数え，viewer_index の形式の索引を書き出します．
+    その場合は out のエンコーディングによらず out の下のバイナリストリームに UTF-8 で書き出し，
+    バイト位置はそのストリーム上の位置とします．
+    """
+    # Print state and transition counts in one line
+    header = f"{n} {t}\n"
+    if index is None:
+        out.write(header)
+        # Print modified transitions with new state IDs, sorted by source and destination IDs
+        _write_lines(out, rows)
+        # Print states with new state IDs, sorted by new state ID
+        printStates(labels, states, out)
+        return
+
+    position = 0
+    row_start = array("q", [0]) * (n + 1)
+    state_start = array("q", [-1]) * n
+    state_end = array("q", [-1]) * n
+
+    def transition_lines() -> Iterator[str]:
+        nonlocal position
+        # Lines are in the order of the transitions, so the lines of state s start at line
+        # offsets[s]
+        offsets = transitions.offsets
+        state = 0
+        for edge, line in enumerate(rows):
+            while offsets[state] == edge:
+                row_start[state] = position
+                state += 1
+            position += _utf8_size(line) + 1
+            yield line
+        for state in range(state, n + 1):
+            row_start[state] = position
+
+    def state_lines() -> Iterator[str]:
+        nonlocal position
+        for state_id, line in _state_lines(labels, states):
+            state_start[state_id] = position
+            position += _utf8_size(line) + 1
+            state_end[state_id] = position
+            yield line
+
+    out.flush()
+    binary = out.buffer
+    utf8 = io.TextIOWrapper(binary, encoding="utf-8", newline="\n")
+    try:
+        utf8.write(header)
+        utf8.flush()
+        if binary.seekable():
+            # A file opened for appending (>>) is positioned at its end only after the
+            # first write, so the position is read after the header
+            position = binary.tell()
+        else:
+            # Pipes have no position, so positions are from the start of the stream
+            position = len(header)
+        _write_lines(utf8, transition_lines())
+        _write_state_lines(utf8, state_lines())
+    finally:
+        # Flush, leaving the binary stream open for out
+        utf8.detach()
+    write_index(index, t, state_start, state_end, row_start, transitions.offsets)
+
+
+def _state_lines(labels: List[Label], states: List[State]) -> Iterator[Tuple[int, str]]:
+    """
+    状態 ID と，その状態とラベルを表す行を状態の順に返します．
     """
     # label Dictionary
     label_map: Dict[int, List[str]] = {}
@@ -271,9 +512,20 @@ def printStates(labels: List[Label], states: List[State]) -> None:
             label_map[state_id] = []
         label_map[state_id].append(label)
 
-    # Print states with new state IDs, sorted by new state ID
     for state_id, state_content in states:
-        label_str = ""
-        if state_id in label_map:
-            label_str = " " + ",".join(label_map[state_id])
-        print(f"{state_id} {{{state_content.strip()}}}{label_str}")
+        yield state_id, f"{state_id} {{{state_content.strip()}}}" + (
+            " " + ",".join(label_map[state_id]) if state_id in label_map else ""
+        )
+
+
+def printStates(labels: List[Label], states: List[State], out: TextIO) -> None:
+    """
+    状態とラベルを出力します。
+
+    Args:
+        labels (List[Label]): ラベルデータ
+        states (List[State]): 状態データ
+        out (TextIO): 出力先
+    """
+    # Print states with new state IDs, sorted by new state ID
+    _write_state_lines(out, (line for _, line in _state_lines(labels, states)))
@@ -1,47 +1,446 @@
+import io
+import mmap
+import os
 import re
-from typing import List, Tuple
-from type import RawTransition, RawState, RawLabel
+import stat
+from array import array
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+from type import RawTransition, RawState, RawLabel, StateList, TextSpans, TextTable
 
+# Number of characters read from the input at once
+CHUNK_SIZE = 1 << 20
+# Upper bound of the length of a token other than state bodies
+_LOOKAHEAD = 1 << 16
 
-def parse_input(
-    input_data: str,
-) -> Tuple[int, int, str, List[RawTransition], List[RawState]]:
+# Events emitted by iter_input
+EVENT_STATE_COUNT = "n"
+EVENT_TRANSITION_COUNT = "t"
+EVENT_INITIAL_STATE = "initial_state"
+EVENT_TRANSITIONS = "transitions"
+EVENT_STATE = "state"
+EVENT_LABEL = "label"
+
+_TOKEN_START_RE = re.compile(r"state\(|label\(|transitions\(\[|ret\(ss\(|n\(|t\(")
+_MAX_TOKEN_START = len("transitions([")
+
+_STATE_COUNT_RE = re.compile(r"n\((\d+)\)")
+_TRANSITION_COUNT_RE = re.compile(r"t\((\d+)\)")
+_INITIAL_STATE_RE = re.compile(r"ret\(ss\((\d+),<state_map>")
+_TRANSITION_RE = re.compile(r"\[(\d+)\|(\d+)\]")
+_STATE_HEAD_RE = re.compile(r"state\((\d+),\{")
+_LABEL_RE = re.compile(r'label\((\d+),"([^"]+)"\)')
+
+_TRANSITIONS_END = "])"
+_STATE_END = "})"
+
+# The same tokens for memory-mapped input, which is scanned as bytes
+_TOKEN_START_BYTES_RE = re.compile(_TOKEN_START_RE.pattern.encode())
+_STATE_COUNT_BYTES_RE = re.compile(_STATE_COUNT_RE.pattern.encode())
+_TRANSITION_COUNT_BYTES_RE = re.compile(_TRANSITION_COUNT_RE.pattern.encode())
+_INITIAL_STATE_BYTES_RE = re.compile(_INITIAL_STATE_RE.pattern.encode())
+# The head of a state also takes the ASCII whitespace at the start of its body
+_STATE_HEAD_BYTES_RE = re.compile(
+    _STATE_HEAD_RE.pattern.encode() + rb"[\t-\r\x1c-\x1f ]*"
+)
+_LABEL_BYTES_RE = re.compile(_LABEL_RE.pattern.encode())
+
+# Characters that str.strip removes and that are encoded as one byte in UTF-8
+_ASCII_WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+# Bytes at either end of a body that may have to be stripped
+_STRIP_EDGE_BYTES = frozenset(_ASCII_WHITESPACE) | frozenset(range(0x80, 0x100))
+
+# Names of the attributes that modifier.parse_state_attributes reads from a state
+_STATE_ATTRIBUTE_PREFIXES = ("rule_name(", "action(", "weight(", "rate(", "reward(")
+_STATE_ATTRIBUTE_BYTE_PREFIXES = tuple(
+    prefix.encode() for prefix in _STATE_ATTRIBUTE_PREFIXES
+)
+_STATE_ATTRIBUTE_PREFIX_RE = re.compile(
+    "|".join(re.escape(prefix) for prefix in _STATE_ATTRIBUTE_PREFIXES)
+)
+_STATE_ATTRIBUTE_PREFIX_BYTES_RE = re.compile(
+    _STATE_ATTRIBUTE_PREFIX_RE.pattern.encode()
+)
+# Length up to which one regex scan beats a find per name. The regex tests every
+# character, while find skips ahead, so find is faster on long bodies.
+_SHORT_BODY = 160
+
+
+def has_state_attributes(
+    state_content: Union[str, bytes], pos: int = 0, endpos: Optional[int] = None
+) -> bool:
     """
-    メタインタプリタの実行結果をパースして，状態数，遷移数，初期状態ID，遷移，状態を抽出します．
+    状態の内容 state_content[pos:endpos] がルール情報を含みうるかを内容をコピーせずに調べます．
+    False の場合，parse_state_attributes はすべての項目が None の結果を返します．
+    state_content にはバイト列やメモリマップした入力も使えます．
     """
-    # Extract n (state count) and t (transition count)
-    n_match = re.search(r"n\((\d+)\)", input_data)
-    t_match = re.search(r"t\((\d+)\)", input_data)
+    if endpos is None:
+        endpos = len(state_content)
+    is_str = isinstance(state_content, str)
+    if endpos - pos <= _SHORT_BODY:
+        # One scan of the body for any of the names
+        prefix_re = (
+            _STATE_ATTRIBUTE_PREFIX_RE if is_str else _STATE_ATTRIBUTE_PREFIX_BYTES_RE
+        )
+        return prefix_re.search(state_content, pos, endpos) is not None
+    prefixes = _STATE_ATTRIBUTE_PREFIXES if is_str else _STATE_ATTRIBUTE_BYTE_PREFIXES
+    for prefix in prefixes:
+        if state_content.find(prefix, pos, endpos) >= 0:
+            return True
+    return False
 
-    if not n_match or not t_match:
-        raise ValueError("Error: Could not find state or transition count.")
 
-    n = int(n_match.group(1))
-    t = int(t_match.group(1))
+def iter_input(
+    stream: TextIO, chunk_size: int = CHUNK_SIZE, state_contents: bool = True
+) -> Iterator[Tuple[str, object]]:
+    """
+    メタインタプリタの実行結果をチャンク単位で読みながら 1 回の走査でトークンを切り出し，
+    (イベント種別, 値) の組を順に返します．
 
-    # Extract initial state ID
-    initial_state_match = re.search(r"ret\(ss\((\d+),<state_map>", input_data)
-    if not initial_state_match:
-        raise ValueError("Error: Could not find initial state ID.")
+    遷移は EVENT_TRANSITIONS としてチャンクごとにまとめて返します．
+    状態本体の内部はトークンとして解釈しません．
+    state_contents が False の場合，ルール情報を含まない状態本体は切り出さず，EVENT_STATE の本体は None になります．
+    """
+    buf = ""
+    pos = 0
+    eof = False
+    in_transitions = False
+    transitions_seen = False
+
+    def refill(size: int) -> None:
+        nonlocal buf, pos, eof
+        chunk = stream.read(size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        if in_transitions:
+            end = buf.find(_TRANSITIONS_END, pos)
+            if end >= 0:
+                yield EVENT_TRANSITIONS, _TRANSITION_RE.findall(buf, pos, end)
+                pos = end + len(_TRANSITIONS_END)
+                in_transitions = False
+                continue
+            if eof:
+                raise ValueError("Error: Could not find transitions.")
+
+            # A transition never contains "[", so everything before the last one is complete
+            cut = buf.rfind("[", pos)
+            if cut > pos:
+                yield EVENT_TRANSITIONS, _TRANSITION_RE.findall(buf, pos, cut)
+                pos = cut
+            elif cut < 0:
+                pos = max(pos, len(buf) - 1)
+            refill(chunk_size)
+            continue
+
+        m = _TOKEN_START_RE.search(buf, pos)
+        if m is None:
+            if eof:
+                break
+            pos = max(pos, len(buf) - (_MAX_TOKEN_START - 1))
+            refill(chunk_size)
+            continue
+
+        start = m.start()
+        if not eof and len(buf) - start < _LOOKAHEAD:
+            # The match may be the tail of a longer token that is not fully read yet
+            pos = max(pos, start - (_MAX_TOKEN_START - 1))
+            refill(chunk_size)
+            continue
+
+        token = m.group()
+        pos = start + 1
+        if token == "state(":
+            head = _STATE_HEAD_RE.match(buf, start)
+            if not head:
+                continue
+            end = buf.find(_STATE_END, head.end())
+            if end < 0:
+                if not eof:
+                    # Grow geometrically so that huge state bodies stay linear
+                    pos = start
+                    refill(max(chunk_size, len(buf) - start))
+                continue
+            if state_contents or has_state_attributes(buf, head.end(), end):
+                yield EVENT_STATE, (head.group(1), buf[head.end() : end])
+            else:
+                yield EVENT_STATE, (head.group(1), None)
+            pos = end + len(_STATE_END)
+        elif token == "label(":
+            label = _LABEL_RE.match(buf, start)
+            if label:
+                yield EVENT_LABEL, (label.group(1), label.group(2))
+                pos = label.end()
+        elif token == "transitions([":
+            pos = m.end()
+            if not transitions_seen:
+                transitions_seen = True
+                in_transitions = True
+        elif token == "ret(ss(":
+            initial_state = _INITIAL_STATE_RE.match(buf, start)
+            if initial_state:
+                yield EVENT_INITIAL_STATE, initial_state.group(1)
+                pos = initial_state.end()
+        else:
+            count_re = _STATE_COUNT_RE if token == "n(" else _TRANSITION_COUNT_RE
+            count = count_re.match(buf, start)
+            if count:
+                event = EVENT_STATE_COUNT if token == "n(" else EVENT_TRANSITION_COUNT
+                yield event, int(count.group(1))
+                pos = count.end()
+
+
+def iter_mapped_input(
+    buffer: mmap.mmap, state_contents: bool = True
+) -> Iterator[Tuple[str, object]]:
+    """
+    メモリマップした実行結果をバイト列のまま 1 回の走査でトークンに切り出し，iter_input と同じイベントを返します．
+    EVENT_STATE の本体は文字列ではなく，前後の空白を除いた buffer 中の範囲 (開始, 終了) です．
+    遷移は CHUNK_SIZE バイトごとにまとめて返します．
+    """
+    pos = 0
+    transitions_seen = False
+    while True:
+        m = _TOKEN_START_BYTES_RE.search(buffer, pos)
+        if m is None:
+            break
+
+        start = m.start()
+        token = m.group()
+        pos = start + 1
+        if token == b"state(":
+            head = _STATE_HEAD_BYTES_RE.match(buffer, start)
+            if not head:
+                continue
+            end = buffer.find(b"})", head.end())
+            if end < 0:
+                continue
+            state_id = str(head.group(1), "ascii")
+            if state_contents or has_state_attributes(buffer, head.end(), end):
+                body_start, body_end = head.end(), end
+                if body_start < body_end and (
+                    buffer[body_start] in _STRIP_EDGE_BYTES
+                    or buffer[body_end - 1] in _STRIP_EDGE_BYTES
+                ):
+                    body_start, body_end = _strip_span(buffer, body_start, body_end)
+                yield EVENT_STATE, (state_id, (body_start, body_end))
+            else:
+                yield EVENT_STATE, (state_id, None)
+            pos = end + len(_STATE_END)
+        elif token == b"label(":
+            label = _LABEL_BYTES_RE.match(buffer, start)
+            if label:
+                yield EVENT_LABEL, (
+                    str(label.group(1), "ascii"),
+                    str(label.group(2), "utf-8"),
+                )
+                pos = label.end()
+        elif token == b"transitions([":
+            pos = m.end()
+            if transitions_seen:
+                continue
+            transitions_seen = True
+            end = buffer.find(b"])", pos)
+            if end < 0:
+                raise ValueError("Error: Could not find transitions.")
+            # An empty block is still reported, as iter_input does
+            while True:
+                # A transition never contains "[", so cut the block before one
+                cut = end
+                if end - pos > CHUNK_SIZE:
+                    cut = buffer.rfind(b"[", pos + 1, pos + CHUNK_SIZE)
+                    if cut < 0:
+                        cut = buffer.find(b"[", pos + 1, end)
+                    if cut < 0:
+                        cut = end
+                yield EVENT_TRANSITIONS, _TRANSITION_RE.findall(
+                    str(buffer[pos:cut], "utf-8")
+                )
+                pos = cut
+                if pos >= end:
+                    break
+            pos = end + len(_TRANSITIONS_END)
+        elif token == b"ret(ss(":
+            initial_state = _INITIAL_STATE_BYTES_RE.match(buffer, start)
+            if initial_state:
+                yield EVENT_INITIAL_STATE, str(initial_state.group(1), "ascii")
+                pos = initial_state.end()
+        else:
+            is_state_count = token == b"n("
+            count_re = (
+                _STATE_COUNT_BYTES_RE if is_state_count else _TRANSITION_COUNT_BYTES_RE
+            )
+            count = count_re.match(buffer, start)
+            if count:
+                event = EVENT_STATE_COUNT if is_state_count else EVENT_TRANSITION_COUNT
+                yield event, int(count.group(1))
+                pos = count.end()
+
+
+def _strip_span(buffer: mmap.mmap, start: int, end: int) -> Tuple[int, int]:
+    """
+    buffer[start:end] を復号して str.strip した文字列の，buffer 中の範囲を返します．
+    """
+    while start < end and buffer[start] in _ASCII_WHITESPACE:
+        start += 1
+    while start < end and buffer[end - 1] in _ASCII_WHITESPACE:
+        end -= 1
+    if start < end and (buffer[start] >= 0x80 or buffer[end - 1] >= 0x80):
+        # Other whitespace, such as U+3000, is rare; strip it as str does
+        text = str(buffer[start:end], "utf-8")
+        if not text.strip():
+            return start, start
+        leading = text[: len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()) :]
+        start += len(leading.encode("utf-8"))
+        end -= len(trailing.encode("utf-8"))
+    return start, end
 
-    initial_state_id = initial_state_match.group(1)
 
-    # Extract transitions
-    transitions_match = re.search(r"transitions\(\[(.*?)\]\)", input_data, re.DOTALL)
-    if not transitions_match:
+def _collect_input(
+    events: Iterable[Tuple[str, object]],
+    texts: Sequence[str],
+    append_text: Callable[[object], int],
+    state_contents: bool,
+) -> Tuple[int, int, str, List[RawTransition], Sequence[RawState], List[RawLabel]]:
+    """
+    iter_input または iter_mapped_input のイベントを parse_input_stream の結果にまとめます．
+    状態の本体は append_text で texts に追加し，その位置を受け取ります．
+    """
+    n: Optional[int] = None
+    t: Optional[int] = None
+    initial_state_id: Optional[str] = None
+    transitions_raw: Optional[List[RawTransition]] = None
+    state_ids: List[str] = []
+    # Without contents, position of each way-point's text in texts; -1 for other states
+    positions = array("q")
+    labels_raw: List[RawLabel] = []
+
+    for event, value in events:
+        if event == EVENT_TRANSITIONS:
+            if transitions_raw is None:
+                transitions_raw = []
+            # IDs are not interned here. _raw_graph maps each one through its dict anyway.
+            transitions_raw.extend(value)
+        elif event == EVENT_STATE:
+            state_id, content = value
+            state_ids.append(state_id)
+            if state_contents:
+                append_text(content)
+            else:
+                positions.append(-1 if content is None else append_text(content))
+        elif event == EVENT_LABEL:
+            labels_raw.append(value)
+        elif event == EVENT_STATE_COUNT:
+            if n is None:
+                n = value
+        elif event == EVENT_TRANSITION_COUNT:
+            if t is None:
+                t = value
+        elif event == EVENT_INITIAL_STATE:
+            if initial_state_id is None:
+                initial_state_id = value
+
+    if n is None or t is None:
+        raise ValueError("Error: Could not find state or transition count.")
+    if initial_state_id is None:
+        raise ValueError("Error: Could not find initial state ID.")
+    if transitions_raw is None:
         raise ValueError("Error: Could not find transitions.")
 
-    transitions_raw = transitions_match.group(1)
-    transitions_raw: List[RawTransition] = re.findall(
-        r"\[(\d+)\|(\d+)\]", transitions_raw
+    states_raw = StateList(
+        state_ids, texts if state_contents else texts.select(positions)
     )
+    return n, t, initial_state_id, transitions_raw, states_raw, labels_raw
+
 
-    # Extract states
-    states_raw: List[RawState] = re.findall(
-        r"state\((\d+),\{(.*?)\}\)", input_data, re.DOTALL
+def parse_input_stream(
+    stream: TextIO, chunk_size: int = CHUNK_SIZE, state_contents: bool = True
+) -> Tuple[int, int, str, List[RawTransition], Sequence[RawState], List[RawLabel]]:
+    """
+    ストリームからメタインタプリタの実行結果を読み込んでパースし，
+    状態数，遷移数，初期状態ID，遷移，状態，ラベルを抽出します．
+    状態の内容は前後の空白を取り除き，1 つの TextTable にまとめて格納します．
+
+    state_contents が False の場合は，中間状態の除去に必要なルール情報を含む状態 (中間状態) の内容だけを保持し，
+    それ以外の状態の内容は空とします．状態の内容を出力しない場合 (PRISM 形式など) に使います．
+    """
+    texts = TextTable()
+    return _collect_input(
+        iter_input(stream, chunk_size, state_contents),
+        texts,
+        lambda content: texts.append(content.strip()),
+        state_contents,
     )
 
-    # Extract label
-    labels_raw: List[RawLabel] = re.findall(r'label\((\d+),"([^"]+)"\)', input_data)
 
-    return n, t, initial_state_id, transitions_raw, states_raw, labels_raw
+def open_input_file(path: str) -> BinaryIO:
+    """
+    --input の入力ファイルをバイナリモードで開きます．
+
+    Raises:
+        ValueError: ファイルが存在しない，読めないなどの理由で開けない場合
+    """
+    try:
+        return open(path, "rb")
+    except OSError as e:
+        raise ValueError(f"Error: Cannot read input file {path}: {e.strerror}.") from e
+
+
+def parse_input_file(
+    path: str, state_contents: bool = True
+) -> Tuple[int, int, str, List[RawTransition], Sequence[RawState], List[RawLabel]]:
+    """
+    ファイルをメモリマップしてメタインタプリタの実行結果をパースし，parse_input_stream と同じ結果を返します．
+    ファイルは UTF-8 として扱います．状態の内容は文字列にコピーせず，前後の空白を除いたファイル中の範囲として
+    TextSpans に保持し，参照されたときに復号します．そのためメモリ使用量は状態の内容の大きさによらず，
+    遷移と状態 ID の数で決まり，メモリより大きな入力も変換できます．
+
+    Raises:
+        ValueError: 開けない場合，または通常のファイルでない (パイプなど) ためメモリマップできない場合
+    """
+    with open_input_file(path) as f:
+        info = os.fstat(f.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            raise ValueError(f"Error: {path} is not a regular file to memory-map.")
+        # An empty file cannot be mapped, but has nothing to map either
+        try:
+            buffer = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if info.st_size
+                else b""
+            )
+        except OSError as e:
+            raise ValueError(
+                f"Error: Cannot memory-map input file {path}: {e.strerror}."
+            ) from e
+
+    texts = TextSpans(memoryview(buffer))
+    return _collect_input(
+        iter_mapped_input(buffer, state_contents),
+        texts,
+        lambda span: texts.append(*span),
+        state_contents,
+    )
+
+
+def parse_input(
+    input_data: str,
+) -> Tuple[int, int, str, List[RawTransition], Sequence[RawState], List[RawLabel]]:
+    """
+    メタインタプリタの実行結果をパースして，状態数，遷移数，初期状態ID，遷移，状態を抽出します．
+    """
+    return parse_input_stream(io.StringIO(input_data))
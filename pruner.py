@@ -0,0 +1,204 @@
+from array import array
+from collections import deque
+from typing import Collection, Dict, List, Sequence, Tuple
+from model_store import Model
+from type import Label, State, StateList, TextSelection, TransitionGraph
+
+# Rule and action of the self-loops added by this stage, as for a way-point without them
+LOOP_NAME = "UNKNOWN"
+
+
+def reverse_graph(
+    offsets: Sequence[int], dest: Sequence[int]
+) -> Tuple["array[int]", "array[int]"]:
+    """
+    遷移の向きを逆にした CSR 形式のグラフ (offsets, src) を線形時間で作ります．
+    """
+    num_states = len(offsets) - 1
+    reverse_offsets = array("q", [0]) * (num_states + 1)
+    for to in dest:
+        reverse_offsets[to + 1] += 1
+    for state in range(num_states):
+        reverse_offsets[state + 1] += reverse_offsets[state]
+
+    position = reverse_offsets[:-1]
+    src = array("q", [0]) * len(dest)
+    for state in range(num_states):
+        for to in dest[offsets[state] : offsets[state + 1]]:
+            src[position[to]] = state
+            position[to] += 1
+    return reverse_offsets, src
+
+
+def _name_id(names: List[str], name: str) -> int:
+    """
+    names における name の添字を返します．なければ末尾に加えます．
+    """
+    if name not in names:
+        names.append(name)
+    return names.index(name)
+
+
+def _search(
+    offsets: Sequence[int], dest: Sequence[int], sources: List[int], found: bytearray
+) -> None:
+    """
+    sources から幅優先探索で到達する状態の found を 1 にします．found が 1 の状態からは探索しません．
+    """
+    queue = deque()
+    for state in sources:
+        if not found[state]:
+            found[state] = 1
+            queue.append(state)
+    while queue:
+        state = queue.popleft()
+        for to in dest[offsets[state] : offsets[state + 1]]:
+            if not found[to]:
+                found[to] = 1
+                queue.append(to)
+
+
+def prune(
+    model: Model, fix_deadlocks: bool = True, targets: Collection[str] = ()
+) -> Tuple[Model, Dict[str, int]]:
+    """
+    中間状態を取り除いた遷移系を PRISM で検査しやすい形に整えます．処理はすべて遷移数に対して線形時間です．
+
+    targets を与えた場合，それらのラベルを持つ状態 (目標状態) に到達できない状態を吸収状態
+    (自己ループだけを持つ状態) にし，初期状態から到達しなくなった状態を取り除いて状態 ID を詰めます．
+    目標状態に到達する確率や報酬は変わりません．
+    fix_deadlocks が True の場合，遷移を持たない状態 (デッドロック) に自己ループを加えます．
+    PRISM の -fixdl と同じ結果を変換時に 1 度だけ作ります．
+
+    Args:
+        model: 中間状態を取り除いた遷移系 (n, t, transitions, states, labels)
+        fix_deadlocks (bool): デッドロックに自己ループを加えるかどうか
+        targets (Collection[str]): 目標状態のラベル．空の場合は状態を取り除きません
+
+    Returns:
+        model: 整えた遷移系
+        counts (Dict[str, int]): 自己ループを加えたデッドロック数 (deadlocks)，
+            吸収状態にした状態数 (absorbing)，取り除いた状態数 (removed)
+
+    Raises:
+        ValueError: targets のラベルを持つ状態が 1 つもない場合
+    """
+    n, t, transitions, states, labels = model
+    offsets, dest = transitions.offsets, transitions.dest
+    counts = {"deadlocks": 0, "absorbing": 0, "removed": 0}
+
+    # States that can reach a target, found backwards from the targets
+    reaching = bytearray(b"\1") * n
+    if targets:
+        target_states = sorted(
+            {state_id for state_id, label in labels if label in targets}
+        )
+        if not target_states:
+            # Every state would be made absorbing, which is never what was meant
+            raise ValueError(
+                "Error: no state has any of the target labels "
+                f"{', '.join(sorted(targets))} given by --prune-targets."
+            )
+        reverse_offsets, reverse_src = reverse_graph(offsets, dest)
+        reaching = bytearray(n)
+        _search(reverse_offsets, reverse_src, target_states, reaching)
+
+    if all(reaching) and not (
+        fix_deadlocks and any(offsets[s] == offsets[s + 1] for s in range(n))
+    ):
+        return model, counts
+
+    # Rows of non-reaching states are dropped, so the states only they lead to are removed
+    kept = bytearray(n)
+    if all(reaching):
+        kept = bytearray(b"\1") * n
+    else:
+        reaching_offsets = array("q", [0])
+        reaching_dest = array("q")
+        for state in range(n):
+            if reaching[state]:
+                reaching_dest.extend(dest[offsets[state] : offsets[state + 1]])
+            reaching_offsets.append(len(reaching_dest))
+        _search(reaching_offsets, reaching_dest, [0], kept)
+    new_id = array("q", [-1]) * n
+    next_id = 0
+    for state in range(n):
+        if kept[state]:
+            new_id[state] = next_id
+            next_id += 1
+    counts["removed"] = n - next_id
+
+    actions, rules = list(transitions.actions), list(transitions.rules)
+    columns = {
+        "count": array("q"),
+        "weight": array("d"),
+        "rate": array("d"),
+        "reward": array("d"),
+        "action_id": array("q"),
+        "rule_id": array("q"),
+    }
+    loop_values = {
+        "count": 1,
+        "weight": 1.0,
+        "rate": 1.0,
+        "reward": 0.0,
+        "action_id": None,
+        "rule_id": None,
+    }
+    pruned_offsets = array("q", [0])
+    pruned_dest = array("q")
+    for state in range(n):
+        if not kept[state]:
+            continue
+        start, end = offsets[state], offsets[state + 1]
+        if reaching[state] and start < end:
+            pruned_dest.extend(map(new_id.__getitem__, dest[start:end]))
+            for name, column in columns.items():
+                column.extend(getattr(transitions, name)[start:end])
+        elif not reaching[state] or fix_deadlocks:
+            if not reaching[state]:
+                counts["absorbing"] += 1
+            else:
+                counts["deadlocks"] += 1
+            if loop_values["action_id"] is None:
+                loop_values["action_id"] = _name_id(actions, LOOP_NAME)
+                loop_values["rule_id"] = _name_id(rules, LOOP_NAME)
+            pruned_dest.append(new_id[state])
+            for name, column in columns.items():
+                column.append(loop_values[name])
+        pruned_offsets.append(len(pruned_dest))
+
+    pruned_transitions = TransitionGraph(
+        pruned_offsets, pruned_dest, actions=actions, rules=rules, **columns
+    )
+    pruned_states = _renumber_states(states, kept, new_id)
+    pruned_labels: List[Label] = [
+        (new_id[state_id], label) for state_id, label in labels if kept[state_id]
+    ]
+    pruned_model = (
+        next_id,
+        len(pruned_dest),
+        pruned_transitions,
+        pruned_states,
+        pruned_labels,
+    )
+    return pruned_model, counts
+
+
+def _renumber_states(
+    states: Sequence[State], kept: bytearray, new_id: "array[int]"
+) -> Sequence[State]:
+    """
+    残る状態だけを新しい状態 ID に置き換えます．StateList の内容はコピーせずに参照します．
+    """
+    if isinstance(states, StateList):
+        state_ids, texts = states.state_ids, states.texts
+    else:
+        state_ids, texts = [s for s, _ in states], [c for _, c in states]
+    positions = array(
+        "q", (i for i, state_id in enumerate(state_ids) if kept[state_id])
+    )
+    return StateList(
+        array("q", (new_id[state_ids[i]] for i in positions)),
+        TextSelection(texts, positions),
+    )
@@ -0,0 +1,166 @@
+import sys
+from array import array
+from contextlib import contextmanager
+from itertools import chain, repeat
+from operator import itemgetter
+from typing import BinaryIO, Iterator, List, Optional, TextIO, Tuple
+from lib.lazy_numpy import load_numpy
+from output import _write_lines
+from transition_generator import NUMPY_MIN_EDGES
+
+# Sparse matrix of the generated transitions in CSR form, held in arrays or NumPy arrays:
+# (indptr, indices, data, state_offsets, actions). Rows are states, or choices for MDPs;
+# the rows of state s are state_offsets[s] to state_offsets[s + 1]. actions holds the action of
+# each row and is empty except for MDPs.
+SparseMatrix = Tuple[
+    "array[int]", "array[int]", "array[float]", "array[int]", List[str]
+]
+
+
+def sparse_matrix(n: int, model_type: str, generated: list) -> SparseMatrix:
+    """
+    generate_dtmc / generate_mdp / generate_ctmc の結果を CSR 形式の疎行列にします．
+    値は確率 (CTMC ではレート) です．MDP では各行が 1 つの選択 (choice) に当たり，状態の順に並びます．
+    遷移が多く NumPy が利用できる場合は各列をまとめて作ります．
+
+    Args:
+        n (int): 状態数
+        model_type (str): "dtmc", "mdp" または "ctmc"
+        generated (list): 生成した遷移．(開始状態, (選択,) 終了状態) 順に並んでいる必要があります
+    """
+    if len(generated) >= NUMPY_MIN_EDGES and load_numpy() is not None:
+        return _sparse_matrix_numpy(n, model_type, generated)
+    return _sparse_matrix_python(n, model_type, generated)
+
+
+def _sparse_matrix_python(n: int, model_type: str, generated: list) -> SparseMatrix:
+    indptr = array("q", [0])
+    indices = array("q")
+    data = array("d")
+    state_offsets = array("q", [0]) * (n + 1)
+    actions: List[str] = []
+
+    previous = None
+    for row in generated:
+        if model_type == "mdp":
+            src, choice, to, value, action = row
+            key = (src, choice)
+        else:
+            src, to, value = row
+            key = src
+        if key != previous:
+            if previous is not None:
+                indptr.append(len(indices))
+            previous = key
+            state_offsets[src + 1] += 1
+            actions.append(action if model_type == "mdp" else "")
+        indices.append(to)
+        data.append(value)
+    if previous is not None:
+        indptr.append(len(indices))
+    for state in range(n):
+        state_offsets[state + 1] += state_offsets[state]
+
+    if model_type != "mdp":
+        # Every state has a row, even without transitions
+        row_indptr = array("q", [0]) * (n + 1)
+        position = 0
+        for state in range(n):
+            if state_offsets[state + 1] > state_offsets[state]:
+                position += 1
+            row_indptr[state + 1] = indptr[position]
+        return row_indptr, indices, data, array("q", range(n + 1)), []
+    return indptr, indices, data, state_offsets, actions
+
+
+def _sparse_matrix_numpy(n: int, model_type: str, generated: list) -> SparseMatrix:
+    np = load_numpy()
+    count = len(generated)
+    is_mdp = model_type == "mdp"
+
+    def column(k: int, dtype):
+        return np.fromiter(map(itemgetter(k), generated), dtype=dtype, count=count)
+
+    src = column(0, np.int64)
+    indices = column(2 if is_mdp else 1, np.int64)
+    data = column(3 if is_mdp else 2, np.float64)
+    if not is_mdp:
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return indptr, indices, data, np.arange(n + 1, dtype=np.int64), []
+
+    # A new row starts wherever (src, choice) changes
+    choice = column(1, np.int64)
+    changes = (src[1:] != src[:-1]) | (choice[1:] != choice[:-1])
+    starts = np.flatnonzero(np.concatenate(([count > 0], changes)))
+    indptr = np.append(starts, count)
+    state_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src[starts], minlength=n), out=state_offsets[1:])
+    actions = [generated[i][4] for i in starts.tolist()]
+    return indptr, indices, data, state_offsets, actions
+
+
+def output_matrix_market(n: int, matrix: SparseMatrix, out: TextIO) -> None:
+    """
+    疎行列を MatrixMarket の coordinate 形式で出力します．添字は 1 始まりで，値は丸めずに書き出します．
+    MDP の場合は各行が選択で，各状態の最初の行の番号 (1 始まり) をコメントとして先に書き出します．
+    """
+    indptr, indices, data, state_offsets, actions = matrix
+    state_offsets, indptr = state_offsets.tolist(), indptr.tolist()
+    num_rows = len(indptr) - 1
+    out.write("%%MatrixMarket matrix coordinate real general\n")
+    if actions:
+        out.write(f"% rows are the choices of {n} states; first row of each state:\n")
+        _write_lines(
+            out,
+            (
+                "% " + " ".join(str(offset + 1) for offset in state_offsets[i : i + 64])
+                for i in range(0, n + 1, 64)
+            ),
+        )
+    out.write(f"{num_rows} {n} {len(indices)}\n")
+    rows = chain.from_iterable(
+        repeat(row + 1, indptr[row + 1] - indptr[row]) for row in range(num_rows)
+    )
+    columns = (i + 1 for i in indices.tolist())
+    _write_lines(out, map("{} {} {!r}".format, rows, columns, data.tolist()))
+
+
+def output_npz(n: int, matrix: SparseMatrix, f: BinaryIO) -> None:
+    """
+    疎行列を scipy.sparse.load_npz で読み込める CSR 形式の .npz で出力します．
+    各列は Python のオブジェクトを経由せずにそのまま書き出します．
+    MDP の場合は choice_offsets (各状態の行の範囲) と actions (各行の action) も保存します．
+
+    Raises:
+        ValueError: NumPy がインストールされていない場合
+    """
+    np = load_numpy()
+    if np is None:
+        raise ValueError("Error: NumPy is required to write .npz files.")
+    indptr, indices, data, state_offsets, actions = matrix
+    arrays = {
+        "format": np.array(b"csr"),
+        "shape": np.array([len(indptr) - 1, n], dtype=np.int64),
+        "data": np.asarray(data, dtype=np.float64),
+        "indices": np.asarray(indices, dtype=np.int64),
+        "indptr": np.asarray(indptr, dtype=np.int64),
+    }
+    if actions:
+        arrays["choice_offsets"] = np.asarray(state_offsets, dtype=np.int64)
+        arrays["actions"] = np.array(actions, dtype=str)
+    np.savez(f, **arrays)
+
+
+@contextmanager
+def open_binary_output(path: Optional[str]) -> Iterator[BinaryIO]:
+    """
+    出力先のファイルをバイナリモードで開きます．path が None または "-" の場合は標準出力に書き出します．
+    """
+    if path is None or path == "-":
+        sys.stdout.flush()
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+        return
+    with open(path, "wb") as f:
+        yield f
@@ -0,0 +1,151 @@
+import random
+from array import array
+
+import pytest
+
+from minimizer import minimize
+from transition_generator import generate_ctmc, generate_dtmc, generate_mdp
+from type import StateList, TextTable, TransitionGraph
+
+GENERATORS = {"dtmc": generate_dtmc, "mdp": generate_mdp, "ctmc": generate_ctmc}
+
+
+def _random_model(rnd: random.Random):
+    # Few states, weights and labels, so that many states are bisimilar
+    n = rnd.randint(1, 16)
+    offsets = array("q", [0])
+    dest = array("q")
+    for _ in range(n):
+        dest.extend(sorted(rnd.sample(range(n), min(n, rnd.choice([0, 1, 1, 2, 3])))))
+        offsets.append(len(dest))
+    t = len(dest)
+    transitions = TransitionGraph(
+        offsets,
+        dest,
+        count=array("q", (rnd.choice([1, 1, 2]) for _ in range(t))),
+        weight=array("d", (rnd.choice([1.0, 1.0, 2.0]) for _ in range(t))),
+        rate=array("d", (rnd.choice([1.0, 0.5]) for _ in range(t))),
+        reward=array("d", (rnd.choice([0.0, 0.0, 1.0]) for _ in range(t))),
+        action_id=array("q", (rnd.randrange(2) for _ in range(t))),
+        rule_id=array("q", [0]) * t,
+        actions=["act0", "act1"],
+        rules=["r0"],
+    )
+    texts = TextTable()
+    for state in range(n):
+        texts.append(f"s({state}).")
+    states = StateList(array("q", range(n)), texts.select(range(n)))
+    labels = [(state, "goal") for state in range(n) if rnd.random() < 0.2]
+    return n, t, transitions, states, labels
+
+
+def _rewards(model_type, transitions):
+    # (src, action, dest) -> reward. A quotient MDP can have one row per action to a block.
+    return {
+        (src, action if model_type == "mdp" else None, to): reward
+        for src, to, _, _, action, _, _, reward in transitions.modified_transitions()
+    }
+
+
+def _sums(model_type, generated, rewards, block):
+    # State -> {(action, destination block): [value, value times reward]}
+    sums = {}
+    for row in generated:
+        if model_type == "mdp":
+            src, _, to, value, action = row
+        else:
+            (src, to, value), action = row, None
+        total = sums.setdefault(src, {}).setdefault((action, block[to]), [0.0, 0.0])
+        total[0] += value
+        total[1] += value * rewards.get((src, action, to), 0.0)
+    return sums
+
+
+def _baseline(model, model_type):
+    # Naive partition refinement: split every block by the signatures of all its states
+    # until the number of blocks stops changing
+    n, _, transitions, _, labels = model
+    generated = GENERATORS[model_type](transitions)
+    rewards = _rewards(model_type, transitions)
+    label_sets = {}
+    for state, label in labels:
+        label_sets.setdefault(state, set()).add(label)
+    block = [tuple(sorted(label_sets.get(state, ()))) for state in range(n)]
+    while True:
+        sums = _sums(model_type, generated, rewards, block)
+        keys = [
+            (
+                block[state],
+                tuple(
+                    sorted(
+                        (str(key), round(value, 12), round(mass, 12))
+                        for key, (value, mass) in sums.get(state, {}).items()
+                    )
+                ),
+            )
+            for state in range(n)
+        ]
+        refined = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+        if len(refined) == len(set(block)):
+            break
+        block = [refined[key] for key in keys]
+
+    # Number the blocks in the order of their smallest states
+    numbers = {}
+    return [numbers.setdefault(b, len(numbers)) for b in block]
+
+
+MODELS = [_random_model(random.Random(seed)) for seed in range(300)]
+
+
+@pytest.mark.parametrize("model_type", ["dtmc", "mdp", "ctmc"])
+def test_minimize_matches_baseline(model_type):
+    merged = 0
+    for model in MODELS:
+        generated = GENERATORS[model_type](model[2])
+        quotient, block_of = minimize(model, model_type, generated)
+        expected = _baseline(model, model_type)
+        assert list(block_of) == expected
+        assert quotient[0] == max(expected) + 1
+        merged += model[0] - quotient[0]
+    assert merged > 0
+
+
+@pytest.mark.parametrize("model_type", ["dtmc", "mdp", "ctmc"])
+def test_minimize_quotient_transitions(model_type):
+    for model in MODELS:
+        n, _, transitions, _, labels = model
+        generated = GENERATORS[model_type](transitions)
+        quotient, block_of = minimize(model, model_type, generated)
+        m, u, quotient_transitions, quotient_states, quotient_labels = quotient
+        assert (m, u) == (
+            quotient_transitions.num_states,
+            quotient_transitions.num_edges,
+        )
+
+        # Every state moves to each block as its block does in the quotient
+        sums = _sums(model_type, generated, _rewards(model_type, transitions), block_of)
+        quotient_sums = _sums(
+            model_type,
+            GENERATORS[model_type](quotient_transitions),
+            _rewards(model_type, quotient_transitions),
+            range(m),
+        )
+        for state in range(n):
+            expected = sums.get(state, {})
+            actual = quotient_sums.get(block_of[state], {})
+            assert actual.keys() == expected.keys()
+            for key, (value, mass) in expected.items():
+                assert actual[key] == pytest.approx([value, mass])
+
+        # Blocks are listed by their representatives, the smallest states in them
+        representatives = [block_of.index(b) for b in range(m)]
+        assert [state for state, _ in quotient_states] == list(range(m))
+        assert [content for _, content in quotient_states] == [
+            f"s({state})." for state in representatives
+        ]
+        assert quotient_labels == [
+            (block_of[state], label)
+            for state, label in labels
+            if state in representatives
+        ]
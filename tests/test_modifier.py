@@ -0,0 +1,177 @@
+import random
+from collections import Counter, deque
+
+import pytest
+
+from modifier import (
+    _merge_state_attributes,
+    modify_transitions,
+    normalize,
+    normalize_and_modify,
+    parse_state_attributes,
+)
+
+ATTRIBUTES = [
+    'rule_name("r0"). weight(0.5).',
+    'rule_name("r1"). action("act0"). weight(2). rate(1.5).',
+    'action("act1"). reward(0.125).',
+    'rule_name("r2"). rate(2). reward(10). weight(3).',
+    "",
+]
+
+
+def _baseline(initial_state_id, raw_transitions, raw_states, raw_labels):
+    # normalize and modify_transitions before the CSR transition graph was added
+    adjacency_list = {}
+    for src, dest in raw_transitions:
+        adjacency_list.setdefault(src, []).append(dest)
+    state_id_map = {initial_state_id: 0}
+    queue = deque([initial_state_id])
+    while queue:
+        for neighbor in adjacency_list.get(queue.popleft(), []):
+            if neighbor not in state_id_map:
+                state_id_map[neighbor] = len(state_id_map)
+                queue.append(neighbor)
+    transitions = sorted(
+        (state_id_map[src], state_id_map[dest]) for src, dest in raw_transitions
+    )
+    states = sorted(
+        (state_id_map[state_id], content) for state_id, content in raw_states
+    )
+    labels = sorted(
+        ((state_id_map[state_id], label) for state_id, label in raw_labels),
+        key=lambda x: x[0],
+    )
+    normalized = transitions, states, labels
+
+    adjacency_list = {}
+    for src, dest in transitions:
+        adjacency_list.setdefault(src, []).append(dest)
+    state_id_map = {0: 0}
+    queue = deque([0])
+    new_transitions = []
+    tra_attributes = {}
+    while queue:
+        current = queue.popleft()
+        for way_point in adjacency_list.get(current, []):
+            attributes = parse_state_attributes(states[way_point][1])
+            for neighbor in adjacency_list.get(way_point, []):
+                new_transitions.append((current, neighbor))
+                previous = tra_attributes.get((current, neighbor))
+                tra_attributes[(current, neighbor)] = (
+                    attributes
+                    if previous is None
+                    else _merge_state_attributes(previous, attributes)
+                )
+                if neighbor not in state_id_map:
+                    state_id_map[neighbor] = len(state_id_map)
+                    queue.append(neighbor)
+
+    modified_transitions = []
+    for (src, dest), count in Counter(new_transitions).items():
+        rule_name, action, weight, rate, reward = tra_attributes[(src, dest)]
+        modified_transitions.append(
+            (
+                state_id_map[src],
+                state_id_map[dest],
+                count,
+                "UNKNOWN" if rule_name is None else rule_name,
+                "UNKNOWN" if action is None else action,
+                1.0 if weight is None else weight,
+                1.0 if rate is None else rate,
+                0.0 if reward is None else reward,
+            )
+        )
+    modified_states = [
+        (state_id_map[state_id], content.strip())
+        for state_id, content in states
+        if state_id in state_id_map
+    ]
+    modified_labels = [
+        (state_id_map[state_id], label.strip())
+        for state_id, label in labels
+        if state_id in state_id_map
+    ]
+    model = (
+        len(state_id_map),
+        len(modified_transitions),
+        modified_transitions,
+        modified_states,
+        modified_labels,
+    )
+    return normalized, model
+
+
+def _random_model(rnd: random.Random):
+    # States reach way-point states, which reach states. Every state is reachable.
+    num_states = rnd.randint(1, 30)
+    edges = [(rnd.randrange(state), state) for state in range(1, num_states)]
+    edges += [
+        (rnd.randrange(num_states), rnd.randrange(num_states))
+        for _ in range(rnd.randint(0, 2 * num_states))
+    ]
+    # Several way-points between the same pair of states are merged into one transition
+    edges += rnd.sample(edges, len(edges) // 3)
+    rnd.shuffle(edges)
+
+    ids = [
+        str(state_id)
+        for state_id in rnd.sample(range(1, 100000), num_states + len(edges))
+    ]
+    raw_transitions = []
+    raw_states = [(ids[state], f"a({state}). b(c).") for state in range(num_states)]
+    for way_point, (src, dest) in zip(ids[num_states:], edges):
+        raw_transitions += [(ids[src], way_point), (way_point, ids[dest])]
+        raw_states.append((way_point, rnd.choice(ATTRIBUTES)))
+    rnd.shuffle(raw_states)
+    raw_labels = [
+        (ids[state], rnd.choice(["goal", "fail"]))
+        for state in range(num_states)
+        if rnd.random() < 0.3
+    ]
+    return ids[0], raw_transitions, raw_states, raw_labels
+
+
+MODELS = [_random_model(random.Random(seed)) for seed in range(200)]
+
+
+def _model(model):
+    n, t, transitions, states, labels = model
+    assert (transitions.num_states, transitions.num_edges) == (n, t)
+    return n, t, list(transitions.modified_transitions()), list(states), labels
+
+
+@pytest.mark.parametrize("raw", MODELS[:20])
+def test_normalize_matches_baseline(raw):
+    (transitions, states, labels), _ = _baseline(*raw)
+    graph, normalized_states, normalized_labels = normalize(*raw)
+    assert list(graph.edges()) == transitions
+    assert list(normalized_states) == states
+    assert normalized_labels == labels
+
+
+def test_modify_transitions_matches_baseline():
+    for raw in MODELS:
+        _, expected = _baseline(*raw)
+        assert _model(modify_transitions(*normalize(*raw))) == expected
+
+
+def test_normalize_and_modify_matches_baseline():
+    for raw in MODELS:
+        _, expected = _baseline(*raw)
+        assert _model(normalize_and_modify(*raw)) == expected
+
+
+def test_transition_graph_rows():
+    for raw in MODELS:
+        _, _, transitions, _, _ = normalize_and_modify(*raw)
+        offsets = transitions.offsets
+        assert offsets[0] == 0 and offsets[-1] == transitions.num_edges
+        assert all(start <= end for start, end in zip(offsets, offsets[1:]))
+        # Each row holds one transition per destination
+        for src in range(transitions.num_states):
+            row = transitions.dest[offsets[src] : offsets[src + 1]]
+            assert len(set(row)) == len(row)
+        assert [edge[:2] for edge in transitions.modified_transitions()] == list(
+            transitions.edges()
+        )
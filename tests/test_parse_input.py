@@ -0,0 +1,127 @@
+import io
+import random
+import re
+
+import pytest
+
+from bench.generate_input import generate
+from parse_input import parse_input, parse_input_file, parse_input_stream
+
+
+def _baseline(text: str):
+    # parse_input before the streaming parser was added, with state contents stripped
+    n = int(re.search(r"n\((\d+)\)", text).group(1))
+    t = int(re.search(r"t\((\d+)\)", text).group(1))
+    initial_state_id = re.search(r"ret\(ss\((\d+),<state_map>", text).group(1)
+    transitions = re.search(r"transitions\(\[(.*?)\]\)", text, re.DOTALL).group(1)
+    transitions = re.findall(r"\[(\d+)\|(\d+)\]", transitions)
+    states = [
+        (state_id, content.strip())
+        for state_id, content in re.findall(
+            r"state\((\d+),\{(.*?)\}\)", text, re.DOTALL
+        )
+    ]
+    labels = re.findall(r'label\((\d+),"([^"]+)"\)', text)
+    return n, t, initial_state_id, transitions, states, labels
+
+
+def _result(parsed):
+    n, t, initial_state_id, transitions, states, labels = parsed
+    return n, t, initial_state_id, list(transitions), list(states), list(labels)
+
+
+CONTENTS = [
+    "",
+    "   ",
+    'a(1). b("x y").',
+    "a(1).\n  b(c, d).\n  e.",
+    '\t rule_name("r0"). weight(0.5). \n',
+    'action("act1"). rate(2). reward(0.125). rule_name("r1").',
+    '状態(1). 名前("あ").',
+    "　全角の空白　",
+    "\u2028é(1).\x85",
+    "x" * 300 + ' weight(3). rule_name("long").',
+    "n(1). t(2). ret(ss(9,<state_map>)).",
+]
+SEPARATORS = ["\n", " ", "\r\n", "\n\n", ", "]
+
+
+def _random_text(rnd: random.Random) -> str:
+    ids = [str(state_id) for state_id in rnd.sample(range(1, 10000), 30)]
+    transitions = [(rnd.choice(ids), rnd.choice(ids)) for _ in range(60)]
+    parts = [f"ret(ss({ids[0]},<state_map>),n({len(ids)}),t({len(transitions)}))"]
+    parts.append(
+        "transitions(["
+        + f",{rnd.choice(SEPARATORS)}".join(
+            f"[{src}|{dest}]" for src, dest in transitions
+        )
+        + "])"
+    )
+    for state_id in ids:
+        if rnd.random() < 0.3:
+            parts.append(f'label({state_id},"{rnd.choice(["goal", "fail"])}")')
+        parts.append(f"state({state_id},{{{rnd.choice(CONTENTS)}}})")
+    return "".join(part + rnd.choice(SEPARATORS) for part in parts)
+
+
+def _texts():
+    rnd = random.Random(0)
+    texts = [_random_text(rnd) for _ in range(20)]
+    generated = io.StringIO()
+    generate(generated, 50, seed=1)
+    return texts + [generated.getvalue()]
+
+
+TEXTS = _texts()
+CHUNK_SIZES = [1, 2, 3, 5, 8, 13, 64, 1000]
+
+
+def test_parse_input_matches_baseline():
+    for text in TEXTS:
+        assert _result(parse_input(text)) == _baseline(text)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_parse_input_stream_chunks(chunk_size):
+    # Tokens and state contents are split across chunks at every position
+    for text in TEXTS:
+        parsed = parse_input_stream(io.StringIO(text), chunk_size=chunk_size)
+        assert _result(parsed) == _result(parse_input(text))
+
+
+def _input_file(directory, text: str) -> str:
+    path = directory / "input.txt"
+    path.write_text(text, encoding="utf-8", newline="")
+    return str(path)
+
+
+def test_parse_input_file(tmp_path):
+    # State contents are kept as spans of the mapping and stripped of Unicode whitespace
+    for text in TEXTS:
+        parsed = parse_input_file(_input_file(tmp_path, text))
+        assert _result(parsed) == _result(parse_input(text))
+
+
+def test_parse_input_file_without_state_contents(tmp_path):
+    for text in TEXTS:
+        parsed = parse_input_file(_input_file(tmp_path, text), state_contents=False)
+        expected = parse_input_stream(io.StringIO(text), state_contents=False)
+        assert _result(parsed) == _result(expected)
+
+
+def test_parse_input_file_errors(tmp_path):
+    with pytest.raises(ValueError, match="Cannot read input file"):
+        parse_input_file(str(tmp_path / "missing.txt"))
+    with pytest.raises(ValueError, match="Cannot read input file"):
+        parse_input_file(str(tmp_path))
+    # An empty file is not mapped, and has no counts
+    with pytest.raises(ValueError, match="Could not find state or transition count"):
+        parse_input_file(_input_file(tmp_path, ""))
+
+
+def test_parse_input_errors():
+    text = TEXTS[0]
+    with pytest.raises(ValueError):
+        parse_input(text.replace("<state_map>", "<map>"))
+    with pytest.raises(ValueError):
+        parse_input(re.sub(r"n\(\d+\)", "", text))
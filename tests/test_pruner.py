@@ -0,0 +1,187 @@
+import random
+from array import array
+
+import pytest
+
+from pruner import LOOP_NAME, prune, reverse_graph
+from type import StateList, TextTable, TransitionGraph
+
+LABELS = ["goal", "fail", "busy"]
+
+
+def _random_model(rnd: random.Random):
+    # Every state is reachable from state 0, as in a model with way-points removed.
+    # Some states are deadlocks.
+    n = rnd.randint(1, 40)
+    rows = [set() for _ in range(n)]
+    for state in range(1, n):
+        rows[rnd.randrange(state)].add(state)
+    for _ in range(rnd.randint(0, n)):
+        rows[rnd.randrange(n)].add(rnd.randrange(n))
+    offsets = array("q", [0])
+    dest = array("q")
+    for row in rows:
+        dest.extend(rnd.sample(sorted(row), len(row)))
+        offsets.append(len(dest))
+    t = len(dest)
+    transitions = TransitionGraph(
+        offsets,
+        dest,
+        count=array("q", (rnd.randint(1, 3) for _ in range(t))),
+        weight=array("d", (rnd.choice([0.5, 1.0, 2.0]) for _ in range(t))),
+        rate=array("d", (rnd.choice([1.0, 1.5]) for _ in range(t))),
+        reward=array("d", (rnd.choice([0.0, 10.0]) for _ in range(t))),
+        action_id=array("q", (rnd.randrange(2) for _ in range(t))),
+        rule_id=array("q", (rnd.randrange(3) for _ in range(t))),
+        actions=["act0", "act1"],
+        rules=["r0", "r1", "r2"],
+    )
+    texts = TextTable()
+    for state in range(n):
+        texts.append(f"s({state}).")
+    states = StateList(array("q", range(n)), texts.select(range(n)))
+    labels = [(state, rnd.choice(LABELS)) for state in range(n) if rnd.random() < 0.15]
+    return n, t, transitions, states, labels
+
+
+def _successors(transitions, state):
+    offsets = transitions.offsets
+    return list(transitions.dest[offsets[state] : offsets[state + 1]])
+
+
+def _reaching(transitions, target_states):
+    # States that can reach a target, by iterating to a fixed point
+    reaching = set(target_states)
+    changed = True
+    while changed:
+        changed = False
+        for state in range(transitions.num_states):
+            if state not in reaching and any(
+                to in reaching for to in _successors(transitions, state)
+            ):
+                reaching.add(state)
+                changed = True
+    return reaching
+
+
+def _kept(transitions, reaching):
+    # States reached from the initial state without leaving a state that reaches a target
+    kept = {0}
+    stack = [0]
+    while stack:
+        state = stack.pop()
+        if state in reaching:
+            for to in _successors(transitions, state):
+                if to not in kept:
+                    kept.add(to)
+                    stack.append(to)
+    return kept
+
+
+MODELS = [_random_model(random.Random(seed)) for seed in range(300)]
+
+
+@pytest.mark.parametrize("fix_deadlocks", [False, True])
+@pytest.mark.parametrize("targets", [{"goal"}, {"goal", "fail"}])
+def test_prune_targets(targets, fix_deadlocks):
+    pruned_any = False
+    for model in MODELS:
+        n, _, transitions, states, labels = model
+        target_states = {state for state, label in labels if label in targets}
+        if not target_states:
+            with pytest.raises(ValueError):
+                prune(model, fix_deadlocks, targets)
+            continue
+
+        (m, u, pruned, pruned_states, pruned_labels), counts = prune(
+            model, fix_deadlocks, targets
+        )
+        reaching = _reaching(transitions, target_states)
+        kept = _kept(transitions, reaching)
+        pruned_any = pruned_any or counts["removed"] > 0
+
+        # Pruned states are numbered in the order of the original states
+        original = [int(content[2:-2]) for _, content in pruned_states]
+        assert [state for state, _ in pruned_states] == list(range(m))
+        assert original == sorted(kept)
+        new_id = {state: i for i, state in enumerate(original)}
+        assert (m, u) == (pruned.num_states, pruned.num_edges)
+        assert counts["removed"] == n - m
+        assert pruned_labels == [
+            (new_id[state], label) for state, label in labels if state in kept
+        ]
+
+        pruned_rows = list(pruned.modified_transitions())
+        absorbing = deadlocks = 0
+        for state in original:
+            start, end = (
+                pruned.offsets[new_id[state]],
+                pruned.offsets[new_id[state] + 1],
+            )
+            rows = pruned_rows[start:end]
+            if (
+                state in reaching
+                and transitions.offsets[state] < transitions.offsets[state + 1]
+            ):
+                # Transitions of states that reach a target are kept as they are
+                expected = [
+                    (new_id[row[0]], new_id[row[1]], *row[2:])
+                    for row in transitions.modified_transitions()
+                    if row[0] == state
+                ]
+                assert rows == expected
+            elif state not in reaching or fix_deadlocks:
+                absorbing += state not in reaching
+                deadlocks += state in reaching
+                assert rows == [
+                    (
+                        new_id[state],
+                        new_id[state],
+                        1,
+                        LOOP_NAME,
+                        LOOP_NAME,
+                        1.0,
+                        1.0,
+                        0.0,
+                    )
+                ]
+            else:
+                assert rows == []
+        assert (counts["absorbing"], counts["deadlocks"]) == (absorbing, deadlocks)
+
+        # In the pruned model, every state reaches a target or is absorbing
+        pruned_targets = {state for state, label in pruned_labels if label in targets}
+        pruned_reaching = _reaching(pruned, pruned_targets)
+        for state in range(m):
+            assert state in pruned_reaching or _successors(pruned, state) == [state]
+    assert pruned_any
+
+
+def test_fix_deadlocks_only():
+    for model in MODELS:
+        n, t, transitions, states, labels = model
+        (m, u, pruned, pruned_states, pruned_labels), counts = prune(model, True)
+        deadlocks = [state for state in range(n) if not _successors(transitions, state)]
+        assert (m, u) == (n, t + len(deadlocks))
+        assert counts == {"deadlocks": len(deadlocks), "absorbing": 0, "removed": 0}
+        for state in range(n):
+            expected = (
+                [state] if state in deadlocks else _successors(transitions, state)
+            )
+            assert _successors(pruned, state) == expected
+        assert pruned_labels == labels
+
+
+def test_reverse_graph():
+    for _, _, transitions, _, _ in MODELS:
+        reverse_offsets, reverse_src = reverse_graph(
+            transitions.offsets, transitions.dest
+        )
+        for state in range(transitions.num_states):
+            assert list(
+                reverse_src[reverse_offsets[state] : reverse_offsets[state + 1]]
+            ) == [
+                src
+                for src in range(transitions.num_states)
+                if state in _successors(transitions, src)
+            ]
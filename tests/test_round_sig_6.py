@@ -0,0 +1,110 @@
+import math
+import random
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+import pytest
+
+from lib import round_sig_6 as module
+from lib.round_sig_6 import round_sig_6, round_sig_6_batch
+
+
+def _baseline(num: float) -> str:
+    # round_sig_6 before the fast path and the cache were added
+    if num == 0:
+        return "0"
+    dnum = Decimal(str(num))
+    exponent = -int(math.floor(math.log10(abs(num)))) + 5
+    rounded = dnum.quantize(Decimal("1e-" + str(exponent)), rounding=ROUND_HALF_UP)
+    return format(rounded.normalize(), "f").rstrip("0").rstrip(".")
+
+
+def _outcome(function, num: float):
+    try:
+        return function(num)
+    except Exception as e:
+        return type(e)
+
+
+ZERO = [0.0, -0.0]
+TIES = [
+    0.1234565,
+    0.1234575,
+    1.000005,
+    2.500005,
+    12.345650,
+    123456.5,
+    999999.5,
+    0.9999995,
+    0.00001234565,
+]
+POWERS_OF_TEN = [10.0**k for k in range(-12, 6)] + [
+    math.nextafter(10.0**k, direction)
+    for k in range(-12, 6)
+    for direction in (0.0, math.inf)
+]
+SMALL = [1e-300, 5e-324, 1.234567e-20, 3.3333333e-9, 2.2250738585072014e-308]
+ERRORS = [1e6, 1234567.0, 1e300, math.inf, math.nan]
+
+
+def _values():
+    rnd = random.Random(0)
+    values = ZERO + TIES + POWERS_OF_TEN + SMALL + ERRORS
+    values += [rnd.random() for _ in range(2000)]
+    values += [rnd.uniform(-1e6, 1e6) for _ in range(2000)]
+    values += [
+        float(Fraction(rnd.randint(1, 999), rnd.randint(1, 999))) for _ in range(2000)
+    ]
+    values += [rnd.random() * 10.0 ** rnd.randint(-30, 5) for _ in range(2000)]
+    return values + [-value for value in values]
+
+
+VALUES = _values()
+
+
+@pytest.mark.parametrize(
+    "num", ZERO + TIES + POWERS_OF_TEN + SMALL + [-v for v in TIES + SMALL]
+)
+def test_round_sig_6_matches_baseline(num):
+    assert round_sig_6(num) == _baseline(num)
+
+
+@pytest.mark.parametrize("num", ERRORS + [-v for v in ERRORS])
+def test_round_sig_6_raises_as_baseline(num):
+    expected = _outcome(_baseline, num)
+    assert isinstance(expected, type)
+    with pytest.raises(expected):
+        round_sig_6(num)
+
+
+def test_round_sig_6_sweep():
+    mismatches = [
+        num for num in VALUES if _outcome(round_sig_6, num) != _outcome(_baseline, num)
+    ]
+    assert mismatches == []
+
+
+def test_round_sig_6_batch_matches_baseline():
+    module._cache.clear()
+    nums = [num for num in VALUES if not isinstance(_outcome(_baseline, num), type)]
+    expected = [_baseline(num) for num in nums]
+    # The second pass is served from the cache
+    assert round_sig_6_batch(nums) == expected
+    assert round_sig_6_batch(nums) == expected
+    assert round_sig_6_batch(reversed(nums)) == expected[::-1]
+
+
+def test_round_sig_6_batch_raises_as_baseline():
+    for num in ERRORS:
+        with pytest.raises(_outcome(_baseline, num)):
+            round_sig_6_batch([0.5, num])
+
+
+def test_round_sig_6_batch_cache_limit(monkeypatch):
+    module._cache.clear()
+    monkeypatch.setattr(module, "_CACHE_LIMIT", 4)
+    nums = [0.1 * k for k in range(1, 10)]
+    assert round_sig_6_batch(nums) == [_baseline(num) for num in nums]
+    # The cache is cleared before a batch once it holds more than the limit
+    assert round_sig_6_batch([0.5]) == ["0.5"]
+    assert len(module._cache) == 1
@@ -1,134 +1,293 @@
+from array import array
+from itertools import accumulate
+from operator import mul
 from typing import Dict, List
+from lib.lazy_numpy import load_numpy
 from type import (
-    AdjacencyItem,
-    ModifiedTransition,
-    TransitionsAdjacencyList,
+    TransitionGraph,
     TransitionForDTMC,
     TransitionForMDP,
     TransitionForCTMC,
 )
 
+# Below this many transitions, importing NumPy takes longer than it saves
+NUMPY_MIN_EDGES = 1 << 16
 
-def generate_transitions_adjacency_list(
-    modified_transitions: List[ModifiedTransition],
-) -> TransitionsAdjacencyList:
-    transitions: TransitionsAdjacencyList = {}
-    for src, dest, count, _, action, weight, rate, _ in modified_transitions:
-        if src not in transitions:
-            transitions[src] = []
-        transitions[src].append(
-            AdjacencyItem(
-                dest=dest, count=count, action=action, weight=weight, rate=rate
-            )
-        )
-    return transitions
+# NumPy, set by _use_numpy once it is needed
+np = None
+
+
+def _use_numpy(transitions: TransitionGraph) -> bool:
+    """
+    遷移を NumPy でまとめて計算するかどうかを返します．NumPy は初めて使うときに読み込みます．
+    """
+    global np
+    if transitions.num_edges < NUMPY_MIN_EDGES:
+        return False
+    np = load_numpy()
+    return np is not None
 
 
 def generate_dtmc(
-    transitions: TransitionsAdjacencyList,
+    transitions: TransitionGraph,
+) -> List[TransitionForDTMC]:
+    """
+    遷移データと重みから遷移確率を計算します．
+    遷移が多く NumPy が利用できる場合は全遷移をまとめて計算します．
+
+    Args:
+        transitions (TransitionGraph): 遷移データ
+
+    Returns:
+        List[TransitionForDTMC]: (開始状態, 終了状態, 確率) のタプルの (開始状態, 終了状態) 順のリスト
+    """
+    if _use_numpy(transitions):
+        return _generate_dtmc_numpy(transitions)
+    return _generate_dtmc_python(transitions)
+
+
+def generate_mdp(
+    transitions: TransitionGraph,
+) -> List[TransitionForMDP]:
+    """
+    choice(非決定的選択) と重みから遷移確率を計算します．
+    遷移が多く NumPy が利用できる場合は全遷移をまとめて計算します．
+
+    Args:
+        transitions (TransitionGraph): 遷移データ
+
+    Returns:
+        List[TransitionForMDP]:
+            (開始状態, 選択, 終了状態, 確率) のタプルの (開始状態, 選択, 終了状態) 順のリスト
+    """
+    if _use_numpy(transitions):
+        return _generate_mdp_numpy(transitions)
+    return _generate_mdp_python(transitions)
+
+
+def generate_ctmc(
+    transitions: TransitionGraph,
+) -> List[TransitionForCTMC]:
+    """
+    遷移データとレートから遷移率を計算します．
+    遷移が多く NumPy が利用できる場合は全遷移をまとめて計算します．
+
+    Args:
+        transitions (TransitionGraph): 遷移データ
+
+    Returns:
+        List[TransitionForCTMC]: (開始状態, 終了状態, レート) のタプルの (開始状態, 終了状態) 順のリスト
+    """
+    if _use_numpy(transitions):
+        return _generate_ctmc_numpy(transitions)
+    return _generate_ctmc_python(transitions)
+
+
+def mdp_choice_offsets(n: int, mdp_transitions: List[TransitionForMDP]) -> "array[int]":
+    """
+    generate_mdp の結果の各状態の最初の選択が，全状態の選択を状態順に並べた中で何番目かを返します．
+    状態 s の選択は offsets[s] から offsets[s + 1] の前までで，offsets[n] は選択の総数です．
+    選択は各状態で 0 から連番のため，各状態の最後の選択から 1 回の走査で求めます．
+
+    Args:
+        n (int): 状態数
+        mdp_transitions (List[TransitionForMDP]): (開始状態, 選択, 終了状態) 順に並んだMDP遷移系
+
+    Returns:
+        array[int]: 長さ n + 1 の選択の開始位置
+    """
+    num_choices = array("q", bytes(8 * n))
+    for from_state, choice, _, _, _ in mdp_transitions:
+        num_choices[from_state] = choice + 1
+    return array("q", accumulate(num_choices, initial=0))
+
+
+def _generate_dtmc_python(
+    transitions: TransitionGraph,
 ) -> List[TransitionForDTMC]:
     """
     遷移データと重みから遷移確率を計算します．
 
     Args:
-        transitions (TransitionsAdjacencyList): 遷移データ
+        transitions (TransitionGraph): 遷移データ
 
     Returns:
         List[TransitionForDTMC]: (開始状態, 終了状態, 確率) のタプルのリスト
     """
     dtmc_transitions: List[TransitionForDTMC] = []
+    offsets, dest = transitions.offsets, transitions.dest
+    count, weight = transitions.count, transitions.weight
 
-    for from_state, to_states in transitions.items():
-        if not to_states:
+    for from_state in range(transitions.num_states):
+        start, end = offsets[from_state], offsets[from_state + 1]
+        if start == end:
             continue
 
         # Calculate total weight
-        total_weight = sum(
-            adjacency.weight * adjacency.count for adjacency in to_states
-        )
+        weighted = [w * c for w, c in zip(weight[start:end], count[start:end])]
+        total_weight = sum(weighted)
 
-        # Calculate probability for each transition
-        for adjacency in to_states:
-            prob = (adjacency.weight * adjacency.count) / total_weight
-            dtmc_transitions.append((from_state, adjacency.dest, prob))
+        # Calculate probability for each transition, in order of destination
+        for to_state, w in sorted(zip(dest[start:end], weighted)):
+            dtmc_transitions.append((from_state, to_state, w / total_weight))
 
     return dtmc_transitions
 
 
-def generate_mdp(
-    transitions: TransitionsAdjacencyList,
+def _generate_mdp_python(
+    transitions: TransitionGraph,
 ) -> List[TransitionForMDP]:
     """
     choice(非決定的選択) と重みから遷移確率を計算します．
+    各状態の遷移を 1 回走査して action ID に選択の番号を振り，(選択, 終了状態) 順に 1 回だけ並べ替えます．
 
     Args:
-        transitions (TransitionsAdjacencyList): 遷移データ
+        transitions (TransitionGraph): 遷移データ
 
     Returns:
         List[TransitionForMDP]: (開始状態, 選択, 終了状態, 確率) のタプルのリスト
     """
     mdp_transitions: List[TransitionForMDP] = []
+    offsets, dest = transitions.offsets, transitions.dest
+    count, weight = transitions.count, transitions.weight
+    action_id, actions = transitions.action_id, transitions.actions
 
-    for from_state, to_states in transitions.items():
-        if not to_states:
+    for from_state in range(transitions.num_states):
+        start, end = offsets[from_state], offsets[from_state + 1]
+        if start == end:
             continue
 
-        action2choiceId: Dict[str, int] = {}
-        choiceId2action: Dict[int, str] = {}
-        choiceId = 0
-
-        transitionByChoice: Dict[int, List[AdjacencyItem]] = {}
-
-        for adjacency in to_states:
-            if adjacency.action not in action2choiceId:
-                action2choiceId[adjacency.action] = choiceId
-                choiceId2action[choiceId] = adjacency.action
-                transitionByChoice[choiceId] = []
-                choiceId += 1
+        # action ID -> choice ID, in order of first appearance
+        choice_of: Dict[int, int] = {}
+        choices = [
+            choice_of.setdefault(a, len(choice_of)) for a in action_id[start:end]
+        ]
+        weighted = list(map(mul, weight[start:end], count[start:end]))
 
-            transitionByChoice[action2choiceId[adjacency.action]].append(adjacency)
+        # Total weight of each choice, added in order of the transitions
+        totals = [0.0] * len(choice_of)
+        for choice, w in zip(choices, weighted):
+            totals[choice] += w
 
-        for choiceId, adjacencyList in transitionByChoice.items():
-            total_weight = sum(
-                adjacency.weight * adjacency.count for adjacency in adjacencyList
+        mdp_transitions.extend(
+            (from_state, choice, to_state, w / totals[choice], actions[a])
+            for choice, to_state, w, a in sorted(
+                zip(choices, dest[start:end], weighted, action_id[start:end])
             )
-            for adjacency in adjacencyList:
-                prob = (adjacency.weight * adjacency.count) / total_weight
-                mdp_transitions.append(
-                    (
-                        from_state,
-                        choiceId,
-                        adjacency.dest,
-                        prob,
-                        choiceId2action[choiceId],
-                    )
-                )
+        )
 
     return mdp_transitions
 
 
-def generate_ctmc(
-    transitions: TransitionsAdjacencyList,
+def _generate_ctmc_python(
+    transitions: TransitionGraph,
 ) -> List[TransitionForCTMC]:
     """
     遷移データとレートから遷移率を計算します．
 
     Args:
-        transitions (TransitionsAdjacencyList): 遷移データ
+        transitions (TransitionGraph): 遷移データ
 
     Returns:
         List[TransitionForCTMC]: (開始状態, 終了状態, レート) のタプルのリスト
     """
     ctmc_transitions: List[TransitionForCTMC] = []
+    offsets, dest = transitions.offsets, transitions.dest
+    count, rate = transitions.count, transitions.rate
 
-    for from_state, to_states in transitions.items():
-        if not to_states:
-            continue
+    for from_state in range(transitions.num_states):
+        start, end = offsets[from_state], offsets[from_state + 1]
 
-        # Calculate rate for each transition
-        for adjacency in to_states:
-            ctmc_transitions.append(
-                (from_state, adjacency.dest, adjacency.rate * (float)(adjacency.count))
-            )
+        # Calculate rate for each transition, in order of destination
+        for to_state, r, c in sorted(
+            zip(dest[start:end], rate[start:end], count[start:end])
+        ):
+            ctmc_transitions.append((from_state, to_state, r * (float)(c)))
 
     return ctmc_transitions
+
+
+def _columns(transitions: TransitionGraph):
+    """
+    遷移データの各列を NumPy 配列として (コピーせずに) 参照し，遷移ごとの開始状態を添えて返します．
+    """
+    offsets = np.frombuffer(transitions.offsets, dtype=np.int64)
+    src = np.repeat(np.arange(transitions.num_states, dtype=np.int64), np.diff(offsets))
+    dest = np.frombuffer(transitions.dest, dtype=np.int64)
+    count = np.frombuffer(transitions.count, dtype=np.int64)
+    return src, dest, count
+
+
+def _order_by(major, dest, num_states: int):
+    """
+    (major, dest) の昇順に遷移を並べる添字を返します．
+    各行の dest は新しい状態 ID の割り当て順にほぼ並んでいるため，安定ソートはほぼ線形時間で済みます．
+    """
+    return np.argsort(major * num_states + dest, kind="stable")
+
+
+def _divide_by_totals(weighted, group, num_groups: int):
+    """
+    group ごとの weighted の総和で各要素を割ります．
+    bincount は各 group を遷移の順に足し合わせるため，逐次計算と同じ値になります．
+    """
+    totals = np.bincount(group, weights=weighted, minlength=num_groups)
+    if np.any(totals[group] == 0):
+        raise ZeroDivisionError("float division by zero")
+    return weighted / totals[group]
+
+
+def _generate_dtmc_numpy(
+    transitions: TransitionGraph,
+) -> List[TransitionForDTMC]:
+    src, dest, count = _columns(transitions)
+    weighted = np.frombuffer(transitions.weight, dtype=np.float64) * count
+    prob = _divide_by_totals(weighted, src, transitions.num_states)
+
+    order = _order_by(src, dest, transitions.num_states)
+    return list(zip(src[order].tolist(), dest[order].tolist(), prob[order].tolist()))
+
+
+def _generate_mdp_numpy(
+    transitions: TransitionGraph,
+) -> List[TransitionForMDP]:
+    src, dest, count = _columns(transitions)
+    action_id = np.frombuffer(transitions.action_id, dtype=np.int64)
+    weighted = np.frombuffer(transitions.weight, dtype=np.float64) * count
+
+    # Number the (src, action) pairs in order of first appearance. Since the transitions
+    # are grouped by src, this numbering is also grouped by src.
+    key = src * max(len(transitions.actions), 1) + action_id
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    first_order = np.argsort(first, kind="stable")
+    rank = np.empty_like(first_order)
+    rank[first_order] = np.arange(len(first_order))
+    choice = rank[inverse.reshape(-1)]
+
+    # choice ID local to each src
+    choice_src = src[first[first_order]]
+    choice_id = choice - np.searchsorted(choice_src, src)
+
+    prob = _divide_by_totals(weighted, choice, len(first_order))
+
+    order = _order_by(choice, dest, transitions.num_states)
+    actions = transitions.actions
+    return list(
+        zip(
+            src[order].tolist(),
+            choice_id[order].tolist(),
+            dest[order].tolist(),
+            prob[order].tolist(),
+            [actions[a] for a in action_id[order].tolist()],
+        )
+    )
+
+
+def _generate_ctmc_numpy(
+    transitions: TransitionGraph,
+) -> List[TransitionForCTMC]:
+    src, dest, count = _columns(transitions)
+    rate = np.frombuffer(transitions.rate, dtype=np.float64) * count.astype(np.float64)
+
+    order = _order_by(src, dest, transitions.num_states)
+    return list(zip(src[order].tolist(), dest[order].tolist(), rate[order].tolist()))
@@ -1,15 +1,33 @@
+import io
+import os
 import sys
 import argparse
-import os
-from parse_input import parse_input
-from modifier import normalize, modify_transitions
+import copy
+from contextlib import nullcontext
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Optional, TextIO
+from parse_input import open_input_file, parse_input_file, parse_input_stream
+from modifier import normalize, normalize_and_modify, modify_incrementally
+from model_cache import (
+    CACHE_DIR_ENV,
+    DEFAULT_MAX_AGE,
+    DEFAULT_MAX_SIZE,
+    HashingReader,
+    ModelCache,
+    input_digest,
+)
+from lib.profiler import Profiler
+from model_store import Model, load_model, load_state_keys, save_model
+from pruner import prune
+from minimizer import minimize
+from multi_output import CONTENT_KINDS, GENERATORS, KINDS, parse_emit, write_outputs
 from transition_generator import (
-    generate_transitions_adjacency_list,
     generate_dtmc,
     generate_mdp,
     generate_ctmc,
 )
 from output import (
+    open_output,
     output_results,
     output_modified_results,
     output_dtmc,
@@ -17,17 +35,139 @@ from output import (
     output_ctmc,
     output_labels,
     output_trew,
+    output_state_mapping,
     output_dtmc_for_state_viewer,
     output_mdp_for_state_viewer,
     output_ctmc_for_state_viewer,
 )
-from type import (
-    TransitionsAdjacencyList,
-)
 
+if TYPE_CHECKING:
+    from batch import BatchJob
 
-def main() -> None:
-    # Parse command-line arguments
+
+def _parse(input_path: Optional[str], stream: TextIO, state_contents: bool = True):
+    """
+    input_path が与えられた場合はそのファイルをメモリマップして，それ以外は stream を読んでパースします．
+    """
+    if input_path is None:
+        return parse_input_stream(stream, state_contents=state_contents)
+    return parse_input_file(input_path, state_contents)
+
+
+def translate_stdin(
+    cache: Optional[ModelCache],
+    profiler: Optional[Profiler] = None,
+    state_contents: bool = True,
+    input_path: Optional[str] = None,
+) -> Model:
+    """
+    標準入力 (input_path が与えられた場合はそのファイル) を解析し，中間状態を取り除いた遷移系を返します．
+    cache が与えられた場合，同じ入力に対する結果が保存されていればそれを返し，なければ結果を保存します．
+    シーク可能な入力は解析前にハッシュするため，キャッシュにあれば解析を丸ごと省略します．
+    パイプからの入力は解析と同時にハッシュするため，省略できるのは中間状態の除去だけです．
+    state_contents が False の場合，中間状態以外の状態の内容を読み込まず，遷移系の状態の内容は None になります．
+    キャッシュには完全な遷移系を保存するため，cache と同時には使えません．
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    if cache is not None and not state_contents:
+        raise ValueError("Error: Cached models must keep state contents.")
+
+    stream = sys.stdin
+    digest = None
+    hashing = None
+    if cache is not None and input_path is not None:
+        with profiler.stage("cache_lookup"):
+            with open_input_file(input_path) as f:
+                digest = input_digest(f)
+            model = cache.load(digest)
+        if model is not None:
+            return model
+    elif cache is not None:
+        if sys.stdin.buffer.seekable():
+            with profiler.stage("cache_lookup"):
+                digest = input_digest(sys.stdin.buffer)
+                model = cache.load(digest)
+            if model is not None:
+                return model
+        else:
+            hashing = HashingReader(sys.stdin.buffer)
+            stream = io.TextIOWrapper(
+                io.BufferedReader(hashing), encoding=sys.stdin.encoding
+            )
+
+    with profiler.stage("parse"):
+        n, t, initial_state_id, raw_transitions, raw_states, raw_labels = _parse(
+            input_path, stream, state_contents
+        )
+    profiler.count("raw_transitions", len(raw_transitions))
+    profiler.count("raw_states", len(raw_states))
+    profiler.count("raw_labels", len(raw_labels))
+
+    if hashing is not None:
+        with profiler.stage("cache_lookup"):
+            digest = hashing.hexdigest()
+            model = cache.load(digest)
+        if model is not None:
+            return model
+
+    # Normalize and remove way-point states in one pass
+    with profiler.stage("normalize_and_modify"):
+        model = normalize_and_modify(
+            initial_state_id, raw_transitions, raw_states, raw_labels
+        )
+    if cache is not None:
+        with profiler.stage("cache_store"):
+            cache.store(digest, model)
+    return model
+
+
+def translate_stdin_incrementally(
+    state_path: str,
+    profiler: Optional[Profiler] = None,
+    input_path: Optional[str] = None,
+) -> Model:
+    """
+    標準入力 (input_path が与えられた場合はそのファイル) を解析し，
+    state_path に保存された以前の変換結果の状態 ID をできるだけ保って遷移系を作ります．
+    結果は次回のために state_path に保存します．state_path がなければ通常の変換と同じです．
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    previous_keys = ()
+    if os.path.exists(state_path):
+        with profiler.stage("load_state"):
+            previous_keys = load_state_keys(state_path)
+
+    with profiler.stage("parse"):
+        n, t, initial_state_id, raw_transitions, raw_states, raw_labels = _parse(
+            input_path, sys.stdin
+        )
+    profiler.count("raw_transitions", len(raw_transitions))
+    profiler.count("raw_states", len(raw_states))
+    profiler.count("raw_labels", len(raw_labels))
+
+    with profiler.stage("modify_incrementally"):
+        model, state_keys = modify_incrementally(
+            initial_state_id,
+            raw_transitions,
+            raw_states,
+            raw_labels,
+            previous_keys,
+        )
+    profiler.count("previous_states", len(previous_keys))
+
+    with profiler.stage("save_state"):
+        save_model(state_path, model, state_keys)
+    return model
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    コマンドライン引数のパーサーを作ります．
+    """
     parser = argparse.ArgumentParser(description="Process transition data.")
 
     parser.add_argument(
@@ -56,136 +196,386 @@ def main() -> None:
         help="Output data for state viewer.",
     )
     parser.add_argument(
-        "--tra", type=str, help="Specify output file for --output-for-prism."
+        "--state-viewer-index",
+        type=str,
+        metavar="PATH",
+        help="With --output-state-viewer, also write an index of the byte offsets of "
+        "each state and its transitions in the output to PATH, so that a viewer can "
+        "seek to one state. The output is then written in UTF-8, and offsets are "
+        "positions in the file it is redirected to.",
+    )
+    parser.add_argument(
+        "--tra",
+        type=str,
+        help="Specify output file for --output-for-prism ('-' for stdout).",
+    )
+    parser.add_argument(
+        "--lab",
+        type=str,
+        help="Specify output file for --output-for-prism ('-' for stdout).",
     )
     parser.add_argument(
-        "--lab", type=str, help="Specify output file for --output-for-prism."
+        "--trew",
+        type=str,
+        help="Specify output file for --output-for-prism ('-' for stdout).",
     )
     parser.add_argument(
-        "--trew", type=str, help="Specify output file for --output-for-prism."
+        "--cache-dir",
+        type=str,
+        default=os.environ.get(CACHE_DIR_ENV),
+        help="Cache translated models in this directory, keyed by a hash of the input. "
+        f"Defaults to ${CACHE_DIR_ENV}.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor write the model cache.",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=int,
+        default=DEFAULT_MAX_SIZE >> 20,
+        help="Evict the oldest cached models beyond this total size in MiB. "
+        "Default is %(default)s.",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=DEFAULT_MAX_AGE / (24 * 60 * 60),
+        help="Evict cached models not used for this many days. Default is %(default)s.",
+    )
+    parser.add_argument(
+        "--dump-model",
+        type=str,
+        help="Save the translated model to this file in binary format.",
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        metavar="FILE",
+        help="Read the meta-interpreter output from FILE instead of stdin. The file "
+        "is memory-mapped and state contents are kept as ranges of it instead of "
+        "being copied, so inputs larger than memory can be translated.",
+    )
+    parser.add_argument(
+        "--load-model",
+        type=str,
+        help="Read a model saved with --dump-model instead of stdin.",
+    )
+    parser.add_argument(
+        "--emit",
+        type=str,
+        action="append",
+        default=[],
+        metavar="KIND=PATH",
+        help="Write an output of KIND to PATH ('-' for stdout). Can be repeated to "
+        "write several outputs, for several model types, from one translation. "
+        f"KIND is one of {', '.join(KINDS)}.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used for --emit and for --batch; 0 uses the "
+        "number of CPUs. Default is 1 (serial).",
+    )
+    parser.add_argument(
+        "--incremental",
+        type=str,
+        metavar="STATE_FILE",
+        help="Keep the state numbering of the previous translation saved in "
+        "STATE_FILE, numbering new states after it, and save this translation there. "
+        "The file can also be read with --load-model.",
+    )
+    parser.add_argument(
+        "--fix-deadlocks",
+        action="store_true",
+        help="Add a self-loop to each state without outgoing transitions, as PRISM's "
+        "-fixdl does.",
+    )
+    parser.add_argument(
+        "--prune-targets",
+        type=str,
+        action="append",
+        default=[],
+        metavar="LABEL",
+        help="Make the states that cannot reach a state labelled LABEL absorbing, and "
+        "remove the states only they lead to. Can be repeated for several labels.",
+    )
+    parser.add_argument(
+        "--minimize",
+        action="store_true",
+        help="Merge bisimilar states of the --model-type model, respecting labels and "
+        "transition rewards, before writing it.",
+    )
+    parser.add_argument(
+        "--minimize-map",
+        type=str,
+        metavar="PATH",
+        help="With --minimize, write the quotient state of each original state to PATH.",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="Print wall time and CPU time of each stage, and element counts, to "
+        "stderr.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also trace the peak memory of each stage with "
+        "tracemalloc. Tracing slows the translation down several times, so the "
+        "times are no longer representative.",
+    )
+    parser.add_argument(
+        "--batch",
+        type=str,
+        metavar="SOURCE",
+        help="Translate many inputs in one process pool of --jobs workers instead of "
+        "stdin. SOURCE is a directory, whose files are each translated with the other "
+        "options, or a manifest ('-' for stdin) with one job per line: an input file "
+        "followed by options added for that job. {name} in the options is "
+        "replaced by the input file name without its suffix. A JSON status line is "
+        "written to stdout for each job.",
+    )
+    return parser
 
-    # Read input from stdin
-    input_data = sys.stdin.read()
 
+def main() -> None:
+    # Parse command-line arguments
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.batch:
+        if args.input:
+            parser.error("--input cannot be used with --batch")
+        main_batch(args)
+        return
+
+    profiler = _profiler(args)
     try:
-        n, t, initial_state_id, raw_transitions, raw_states, raw_labels = parse_input(
-            input_data
+        translate(args, profiler)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+    profiler.report(sys.stderr, args.profile)
+
+
+def _profiler(args: argparse.Namespace) -> Profiler:
+    # Memory tracing is opt-in, as it inflates the times the profile reports
+    return Profiler(enabled=args.profile is not None, trace_memory=args.profile_memory)
+
+
+def main_batch(args: argparse.Namespace) -> None:
+    """
+    --batch のジョブをワーカープールで変換します．失敗したジョブがあれば終了コードを 1 にします．
+    """
+    from batch import read_jobs, run_batch
+
+    workers = args.jobs or os.cpu_count() or 1
+    # Each job runs in one worker, unless its own options set --jobs
+    args.jobs = 1
+    succeeded, failed = run_batch(
+        read_jobs(args.batch), partial(_run_batch_job, args), workers, sys.stdout
+    )
+    print(f"Batch: {succeeded} jobs succeeded, {failed} failed.", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+@lru_cache(maxsize=None)
+def _batch_parser() -> argparse.ArgumentParser:
+    # Built once per worker and reused by all its jobs
+    return build_parser()
+
+
+def _run_batch_job(shared: argparse.Namespace, job: "BatchJob") -> None:
+    """
+    共通のオプション shared にジョブのオプションを加えて，標準入力の内容を変換します．
+    """
+    from batch import NAME_PLACEHOLDER, job_name
+
+    _, input_path, options = job
+    name = job_name(input_path)
+    args = _batch_parser().parse_args(options, namespace=copy.deepcopy(shared))
+    if args.batch != shared.batch:
+        raise ValueError("Error: --batch cannot be used in a batch job.")
+    if args.input is not None:
+        raise ValueError("Error: --input cannot be used in a batch job.")
+    for key, value in vars(args).items():
+        if isinstance(value, str):
+            setattr(args, key, value.replace(NAME_PLACEHOLDER, name))
+        elif isinstance(value, list):
+            setattr(args, key, [item.replace(NAME_PLACEHOLDER, name) for item in value])
+
+    profiler = _profiler(args)
+    translate(args, profiler)
+    profiler.report(sys.stderr, args.profile)
+
+
+def translate(args: argparse.Namespace, profiler: Profiler) -> None:
+    """
+    コマンドライン引数に従って変換を行います．
+    """
+    emits = [parse_emit(spec) for spec in args.emit]
+    if args.output_normalized and (args.load_model or emits or args.incremental):
+        raise ValueError(
+            "Error: --output-normalized cannot be used with --load-model, --emit "
+            "or --incremental."
         )
-        normalized_transitions, normalized_states, normalized_labels = normalize(
-            initial_state_id, raw_transitions, raw_states, raw_labels
+    if args.load_model and args.incremental:
+        raise ValueError("Error: --load-model cannot be used with --incremental.")
+    if args.load_model and args.input:
+        raise ValueError("Error: --load-model cannot be used with --input.")
+    if args.output_normalized and (args.fix_deadlocks or args.prune_targets):
+        raise ValueError(
+            "Error: --output-normalized cannot be used with --fix-deadlocks or "
+            "--prune-targets."
+        )
+    if args.minimize and (emits or args.output_normalized or args.output_modified):
+        raise ValueError(
+            "Error: --minimize cannot be used with --emit, --output-normalized or "
+            "--output-modified, as it depends on --model-type."
+        )
+    if args.state_viewer_index and not args.output_state_viewer:
+        raise ValueError("Error: --state-viewer-index requires --output-state-viewer.")
+    if args.profile_memory and args.profile is None:
+        raise ValueError("Error: --profile-memory requires --profile.")
+    if args.minimize_map and not args.minimize:
+        raise ValueError("Error: --minimize-map requires --minimize.")
+    if args.prune_targets and args.incremental:
+        raise ValueError(
+            "Error: --prune-targets cannot be used with --incremental, as it "
+            "renumbers the states."
         )
 
-        if args.output_normalized:
-            output_results(n, t, normalized_transitions, normalized_states)
-        elif args.output_modified:
-            n, t, transitions, states, labels = modify_transitions(
-                normalized_transitions, normalized_states, normalized_labels
-            )
-            output_modified_results(n, t, transitions, states, labels)
-        elif args.output_for_prism:
-            n, t, transitions_with_info, _, labels = modify_transitions(
-                normalized_transitions, normalized_states, normalized_labels
+    if args.output_normalized:
+        # Read input from stdin chunk by chunk, or map the --input file. The normalized
+        # model is only built for this debugging output and is never cached.
+        with profiler.stage("parse"):
+            n, t, initial_state_id, raw_transitions, raw_states, raw_labels = _parse(
+                args.input, sys.stdin
             )
-            transitions: TransitionsAdjacencyList = generate_transitions_adjacency_list(
-                transitions_with_info
+        with profiler.stage("normalize"):
+            normalized_transitions, normalized_states, _ = normalize(
+                initial_state_id, raw_transitions, raw_states, raw_labels
             )
+        with profiler.stage("output"):
+            output_results(n, t, normalized_transitions, normalized_states, sys.stdout)
+        profiler.count("raw_transitions", len(raw_transitions))
+        profiler.count("states", normalized_transitions.num_states)
+        profiler.count("transitions", normalized_transitions.num_edges)
+        return
 
-            if args.model_type == "dtmc":
-                dtmc_transitions = generate_dtmc(transitions)
+    cache = None
+    if args.cache_dir and not args.no_cache:
+        cache = ModelCache(
+            args.cache_dir,
+            max_size=args.cache_max_size << 20,
+            max_age=args.cache_max_age * 24 * 60 * 60,
+        )
+    if args.load_model:
+        with profiler.stage("load_model"):
+            model = load_model(args.load_model)
+    elif args.incremental:
+        # The numbering depends on the previous translation, so the cache is not used
+        model = translate_stdin_incrementally(args.incremental, profiler, args.input)
+    else:
+        # State contents are only read when an output writes them or the model is kept
+        if emits:
+            state_contents = any(kind in CONTENT_KINDS for kind, _ in emits)
+        else:
+            state_contents = not args.output_for_prism
+        state_contents = state_contents or bool(args.dump_model) or cache is not None
+        model = translate_stdin(cache, profiler, state_contents, args.input)
+    if args.fix_deadlocks or args.prune_targets:
+        with profiler.stage("prune"):
+            model, counts = prune(model, args.fix_deadlocks, set(args.prune_targets))
+        for name, value in counts.items():
+            profiler.count(name, value)
+        print(
+            f"Pruning: {counts['deadlocks']} deadlocks fixed, "
+            f"{counts['absorbing']} states made absorbing, "
+            f"{counts['removed']} states removed.",
+            file=sys.stderr,
+        )
+    if args.dump_model:
+        with profiler.stage("dump_model"):
+            save_model(args.dump_model, model)
+    if args.minimize:
+        with profiler.stage("minimize"):
+            generated = GENERATORS[args.model_type](model[2])
+            quotient, block_of = minimize(model, args.model_type, generated)
+            del generated
+        print(
+            f"Minimization: {model[0]} states -> {quotient[0]} states.",
+            file=sys.stderr,
+        )
+        model = quotient
+        profiler.count("quotient_states", model[0])
+        if args.minimize_map:
+            with profiler.stage("output_minimize_map"), open_output(
+                args.minimize_map
+            ) as f:
+                output_state_mapping(block_of, f)
+    n, t, transitions, states, labels = model
+    profiler.count("states", n)
+    profiler.count("transitions", t)
+    profiler.count("labels", len(labels))
 
-                if args.tra:
-                    os.makedirs(os.path.dirname(args.tra), exist_ok=True)
-                    with open(args.tra, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_dtmc(n, t, dtmc_transitions)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_dtmc(n, t, dtmc_transitions)
-
-                if args.lab:
-                    os.makedirs(os.path.dirname(args.lab), exist_ok=True)
-                    with open(args.lab, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_labels(labels)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_labels(labels)
-
-                if args.trew:
-                    os.makedirs(os.path.dirname(args.trew), exist_ok=True)
-                    with open(args.trew, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_trew(t, transitions_with_info)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-            elif args.model_type == "mdp":
+    if emits:
+        with profiler.stage("emit"):
+            write_outputs(model, emits, args.jobs)
+    elif args.output_modified:
+        with profiler.stage("output"):
+            output_modified_results(n, t, transitions, states, labels, sys.stdout)
+    elif args.output_for_prism:
+        if args.model_type == "dtmc":
+            with profiler.stage("generate"):
+                dtmc_transitions = generate_dtmc(transitions)
+            with profiler.stage("output_tra"), open_output(args.tra) as f:
+                output_dtmc(n, t, dtmc_transitions, f)
+        elif args.model_type == "mdp":
+            with profiler.stage("generate"):
                 mdp_transitions = generate_mdp(transitions)
-
-                if args.tra:
-                    os.makedirs(os.path.dirname(args.tra), exist_ok=True)
-                    with open(args.tra, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_mdp(n, t, mdp_transitions)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_mdp(n, t, mdp_transitions)
-
-                if args.lab:
-                    os.makedirs(os.path.dirname(args.lab), exist_ok=True)
-                    with open(args.lab, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_labels(labels)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_labels(labels)
-            elif args.model_type == "ctmc":
+            with profiler.stage("output_tra"), open_output(args.tra) as f:
+                output_mdp(n, t, mdp_transitions, f)
+        elif args.model_type == "ctmc":
+            with profiler.stage("generate"):
                 ctmc_transitions = generate_ctmc(transitions)
+            with profiler.stage("output_tra"), open_output(args.tra) as f:
+                output_ctmc(n, t, ctmc_transitions, f)
 
-                if args.tra:
-                    os.makedirs(os.path.dirname(args.tra), exist_ok=True)
-                    with open(args.tra, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_ctmc(n, t, ctmc_transitions)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_ctmc(n, t, ctmc_transitions)
-
-                if args.lab:
-                    os.makedirs(os.path.dirname(args.lab), exist_ok=True)
-                    with open(args.lab, "w") as f:
-                        sys.stdout = f  # Redirect stdout to file
-                        output_labels(labels)
-                        sys.stdout = sys.__stdout__  # Reset stdout
-                else:
-                    output_labels(labels)
-
-        elif args.output_state_viewer:
-            n, t, transitions_with_info, states, labels = modify_transitions(
-                normalized_transitions, normalized_states, normalized_labels
-            )
-            transitions: TransitionsAdjacencyList = generate_transitions_adjacency_list(
-                transitions_with_info
+        with profiler.stage("output_lab"), open_output(args.lab) as f:
+            output_labels(labels, f)
+
+        if args.model_type == "dtmc" and args.trew:
+            with profiler.stage("output_trew"), open_output(args.trew) as f:
+                output_trew(t, transitions, f)
+
+    elif args.output_state_viewer:
+        viewer_writers = {
+            "dtmc": output_dtmc_for_state_viewer,
+            "mdp": output_mdp_for_state_viewer,
+            "ctmc": output_ctmc_for_state_viewer,
+        }
+        with profiler.stage("generate"):
+            generated = GENERATORS[args.model_type](transitions)
+        index_file = nullcontext()
+        if args.state_viewer_index:
+            try:
+                index_file = open(args.state_viewer_index, "wb")
+            except OSError as e:
+                raise ValueError(
+                    "Error: Cannot write state viewer index "
+                    f"{args.state_viewer_index}: {e.strerror}."
+                ) from e
+        with profiler.stage("output"), index_file as index:
+            viewer_writers[args.model_type](
+                n, t, transitions, states, generated, labels, sys.stdout, index
             )
-            if args.model_type == "dtmc":
-                dtmc_transitions = generate_dtmc(transitions)
-                output_dtmc_for_state_viewer(
-                    n, t, transitions_with_info, states, dtmc_transitions, labels
-                )
-            elif args.model_type == "mdp":
-                mdp_transitions = generate_mdp(transitions)
-                output_mdp_for_state_viewer(
-                    n, t, transitions_with_info, states, mdp_transitions, labels
-                )
-            elif args.model_type == "ctmc":
-                ctmc_transitions = generate_ctmc(transitions)
-                output_ctmc_for_state_viewer(
-                    n, t, transitions_with_info, states, ctmc_transitions, labels
-                )
-        else:
-            print("Error: No valid output option provided.", file=sys.stderr)
-    except ValueError as e:
-        print(e, file=sys.stderr)
+    elif not args.dump_model:
+        print("Error: No valid output option provided.", file=sys.stderr)
 
 
 if __name__ == "__main__":
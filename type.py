@@ -1,4 +1,5 @@
-from typing import Dict, List, Tuple
+from array import array
+from typing import Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
 
 RawTransition = Tuple[str, str]  # (src, dest)
 RawState = Tuple[str, str]  # (state_id, state_content)
@@ -8,28 +9,216 @@ Transition = Tuple[int, int]  # (src, dest)
 State = Tuple[int, str]  # (state_id, state_content)
 Label = Tuple[int, str]  # (state_id, label)
 
+StateAttributes = Tuple[
+    Optional[str], Optional[str], Optional[float], Optional[float], Optional[float]
+]  # (rule_name, action, weight, rate, reward), None if not present
+
+K = TypeVar("K")
+
 ModifiedTransition = Tuple[
     int, int, int, str, str, float, float, float
 ]  # (src, dest, count, rule_name, action, weight, rate, reward)
 
 
-class AdjacencyItem:
+class TransitionGraph:
+    """
+    圧縮行 (CSR) 形式の遷移グラフ．状態 ID は 0 から連続していることを前提とします．
+
+    状態 src から出る遷移は dest などの各列の offsets[src] から offsets[src + 1] までに格納されます．
+    正規化直後のグラフのように遷移情報を持たない場合，dest 以外の列は空です．
+    action_id と rule_id はそれぞれ actions と rules の添字です．
+    """
+
     def __init__(
-        self, dest: int, count: int, action: str, weight: float, rate: float
+        self,
+        offsets: "array[int]",
+        dest: "array[int]",
+        count: Optional["array[int]"] = None,
+        weight: Optional["array[float]"] = None,
+        rate: Optional["array[float]"] = None,
+        reward: Optional["array[float]"] = None,
+        action_id: Optional["array[int]"] = None,
+        rule_id: Optional["array[int]"] = None,
+        actions: Optional[List[str]] = None,
+        rules: Optional[List[str]] = None,
     ) -> None:
+        self.offsets = offsets
         self.dest = dest
-        self.count = count
-        self.action = action
-        self.weight = weight
-        self.rate = rate
+        self.count = array("q") if count is None else count
+        self.weight = array("d") if weight is None else weight
+        self.rate = array("d") if rate is None else rate
+        self.reward = array("d") if reward is None else reward
+        self.action_id = array("q") if action_id is None else action_id
+        self.rule_id = array("q") if rule_id is None else rule_id
+        self.actions: List[str] = [] if actions is None else actions
+        self.rules: List[str] = [] if rules is None else rules
+
+    @property
+    def num_states(self) -> int:
+        return len(self.offsets) - 1
 
+    @property
+    def num_edges(self) -> int:
+        return len(self.dest)
+
+    def edges(self) -> Iterator[Transition]:
+        """
+        (src, dest) を行順に返します．
+        """
+        offsets, dest = self.offsets, self.dest
+        for src in range(self.num_states):
+            for to in dest[offsets[src] : offsets[src + 1]]:
+                yield src, to
+
+    def modified_transitions(self) -> Iterator[ModifiedTransition]:
+        """
+        遷移情報付きの遷移を行順に返します．
+        """
+        offsets, actions, rules = self.offsets, self.actions, self.rules
+        for src in range(self.num_states):
+            for i in range(offsets[src], offsets[src + 1]):
+                yield (
+                    src,
+                    self.dest[i],
+                    self.count[i],
+                    rules[self.rule_id[i]],
+                    actions[self.action_id[i]],
+                    self.weight[i],
+                    self.rate[i],
+                    self.reward[i],
+                )
 
-TransitionsAdjacencyList = Dict[
-    int, List[AdjacencyItem]
-]  # from_state -> List of (to_state, weight, match_count)
 
 TransitionForDTMC = Tuple[int, int, float]  # (from_state, to_state, probability)
 TransitionForMDP = Tuple[
     int, int, int, float, str
 ]  # (from_state, choice_id, to_state, probability, action)
 TransitionForCTMC = Tuple[int, int, float]  # (from_state, to_state, rate)
+
+
+class TextTable(Sequence[str]):
+    """
+    UTF-8 のヒープに連結して格納した文字列の列．i 番目の文字列はヒープの offsets[i]:offsets[i + 1] です．
+    文字列ごとに Python のオブジェクトを持たず，要素は参照されたときに復号します．
+    heap には追記できる bytearray のほか，ファイルをメモリマップした memoryview も使えます．
+    """
+
+    def __init__(
+        self,
+        offsets: Optional[Sequence[int]] = None,
+        heap: Optional[Sequence[int]] = None,
+    ) -> None:
+        self.offsets = array("q", [0]) if offsets is None else offsets
+        self.heap = bytearray() if heap is None else heap
+
+    def append(self, text: str) -> int:
+        """
+        文字列を末尾に追加し，その位置を返します．
+        """
+        self.heap += text.encode("utf-8")
+        self.offsets.append(len(self.heap))
+        return len(self.offsets) - 2
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        if not -len(self) <= position < len(self):
+            raise IndexError("text position out of range")
+        position %= len(self)
+        return str(
+            self.heap[self.offsets[position] : self.offsets[position + 1]], "utf-8"
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        heap = self.heap
+        for start, end in zip(self.offsets, self.offsets[1:]):
+            yield str(heap[start:end], "utf-8")
+
+    def select(self, positions: Sequence[int]) -> "TextSelection":
+        """
+        positions の位置の文字列だけを順に参照する列を返します．
+        """
+        return TextSelection(self, positions)
+
+
+class TextSpans(Sequence[str]):
+    """
+    UTF-8 のバッファ中の範囲で参照する文字列の列．i 番目の文字列は heap[starts[i]:ends[i]] です．
+    入力ファイルをメモリマップした memoryview を heap にすると，文字列をコピーせずに保持できます．
+    要素は参照されたときに復号します．
+    """
+
+    def __init__(self, heap: Sequence[int]) -> None:
+        self.heap = heap
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def append(self, start: int, end: int) -> int:
+        """
+        heap[start:end] を末尾に追加し，その位置を返します．
+        """
+        self.starts.append(start)
+        self.ends.append(end)
+        return len(self.starts) - 1
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, position: int) -> str:
+        if not -len(self) <= position < len(self):
+            raise IndexError("text position out of range")
+        position %= len(self)
+        return str(self.heap[self.starts[position] : self.ends[position]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        heap = self.heap
+        for start, end in zip(self.starts, self.ends):
+            yield str(heap[start:end], "utf-8")
+
+    def select(self, positions: Sequence[int]) -> "TextSelection":
+        """
+        positions の位置の文字列だけを順に参照する列を返します．
+        """
+        return TextSelection(self, positions)
+
+
+class TextSelection(Sequence[Optional[str]]):
+    """
+    TextTable などの文字列の列の一部を指定した順に参照する列．負の位置の要素は None です．
+    """
+
+    def __init__(self, table: Sequence[str], positions: Sequence[int]) -> None:
+        self.table = table
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        position = self.positions[index]
+        return None if position < 0 else self.table[position]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        table = self.table
+        for position in self.positions:
+            yield None if position < 0 else table[position]
+
+
+class StateList(Sequence[Tuple[K, str]], Generic[K]):
+    """
+    (状態 ID, 文字列) の列．状態の内容を TextTable などにまとめたまま，タプルのリストのように扱えます．
+    """
+
+    def __init__(self, state_ids: Sequence[K], texts: Sequence[str]) -> None:
+        self.state_ids = state_ids
+        self.texts = texts
+
+    def __len__(self) -> int:
+        return len(self.state_ids)
+
+    def __getitem__(self, index: int) -> Tuple[K, str]:
+        return self.state_ids[index], self.texts[index]
+
+    def __iter__(self) -> Iterator[Tuple[K, str]]:
+        return zip(self.state_ids, self.texts)
@@ -0,0 +1,104 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO, List, Optional, Tuple
+
+# File layout:
+#   header:   magic, format version, byte order, then (n, t)
+#   sections: state_start    byte offset of the record of each state in the viewer output,
+#                            -1 for states without one (n entries)
+#             state_end      byte offset of the end of each record, after its newline. A record
+#                            spans several lines if the state content does (n entries)
+#             row_start      byte offset of the first transition line of each state; the last
+#                            entry is the end of the transitions (n + 1 entries)
+#             edge_offsets   index of the first transition of each state, as
+#                            TransitionGraph.offsets (n + 1 entries)
+# Byte offsets are positions in the file the viewer output is written to, in UTF-8
+# (from the start of the output if it is written to a pipe).
+MAGIC = b"PLMTVIX\0"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sII2q")
+_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+
+def write_index(
+    f: BinaryIO,
+    t: int,
+    state_start: "array[int]",
+    state_end: "array[int]",
+    row_start: "array[int]",
+    edge_offsets: "array[int]",
+) -> None:
+    """
+    状態ビューア用の出力の索引をバイナリ形式で書き出します．
+    """
+    n = len(state_start)
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTE_ORDER, n, t))
+    for section in (state_start, state_end, row_start, edge_offsets):
+        f.write(array("q", section))
+
+
+class StateViewerIndex:
+    """
+    状態ビューア用の出力の索引．ファイルをメモリマップして参照するため，開くときに索引全体を読み込みません．
+    出力の中の 1 つの状態の記述とその状態からの遷移の行だけを，シークして読み出せます．
+
+    Raises:
+        ValueError: 形式やバージョンが異なる，またはデータが途中で切れている場合
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError("Error: State viewer index is truncated.")
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        magic, version, byte_order, n, t = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("Error: Not a state viewer index.")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Error: Unsupported state viewer index version {version}."
+            )
+        if byte_order != _BYTE_ORDER:
+            raise ValueError(
+                "Error: State viewer index was written with a different byte order."
+            )
+        if size != _HEADER.size + 8 * (4 * n + 2):
+            raise ValueError("Error: State viewer index is truncated.")
+
+        self.num_states = n
+        self.num_edges = t
+        numbers = buffer[_HEADER.size :].cast("q")
+        self.state_start = numbers[:n]
+        self.state_end = numbers[n : 2 * n]
+        self.row_start = numbers[2 * n : 3 * n + 1]
+        self.edge_offsets = numbers[3 * n + 1 :]
+
+    def read_state(
+        self, viewer: BinaryIO, state: int
+    ) -> Tuple[Optional[str], List[str]]:
+        """
+        viewer (バイナリモードで開いた状態ビューア用の出力) から状態 state の記述と，state からの遷移の行を読み出します．
+        状態の記述は状態の内容が複数行にわたる場合も 1 つの文字列で，末尾の改行を除きます．記述がない場合は None を返します．
+        """
+        if not 0 <= state < self.num_states:
+            raise ValueError(f"Error: State {state} is not in the index.")
+        record = None
+        if self.state_start[state] >= 0:
+            start, end = self.state_start[state], self.state_end[state]
+            viewer.seek(start)
+            record = viewer.read(end - start).decode()[:-1]
+        start, end = self.row_start[state], self.row_start[state + 1]
+        viewer.seek(start)
+        rows = viewer.read(end - start).decode().split("\n")[:-1]
+        return record, rows
+
+    def successors(self, viewer: BinaryIO, state: int) -> List[int]:
+        """
+        状態 state から遷移する状態 ID を遷移の順に返します．
+        """
+        _, rows = self.read_state(viewer, state)
+        return [int(row.split(" ", 2)[1]) for row in rows]